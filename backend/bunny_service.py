@@ -1,3 +1,4 @@
+import asyncio
 import httpx
 import os
 from dotenv import load_dotenv
@@ -28,6 +29,48 @@ _libraries_cache = {
     "fetched_at": None,
     "ttl_seconds": 1800  # 5 minutes — change this number to adjust cache duration
 }
+# Held while the list is fetched, so concurrent page loads on a cold
+# cache wait for one paginated Bunny listing instead of each starting one
+_libraries_fetch_lock = asyncio.Lock()
+
+# Monthly stats per (library_id, year, month). Past months no longer change
+# on Bunny's side, so they are kept far longer than the running month
+_monthly_stats_cache: Dict[tuple, tuple] = {}
+MONTHLY_STATS_TTL_CURRENT = 600
+MONTHLY_STATS_TTL_PAST = 86400 * 30
+
+
+def _monthly_stats_ttl(month: int, year: int) -> int:
+    now = datetime.now(BUNNY_TIMEZONE)
+    return MONTHLY_STATS_TTL_PAST if (year, month) < (now.year, now.month) else MONTHLY_STATS_TTL_CURRENT
+
+
+def clear_monthly_stats_cache():
+    _monthly_stats_cache.clear()
+
+# One pooled client for every Bunny.net call so keep-alive connections
+# (and their TLS sessions) are reused across requests
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared AsyncClient, creating it on first use."""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            verify=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=50, max_connections=100)
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """Close the shared AsyncClient (called on app shutdown)."""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
 
 
 def get_library_api_key(library_id: int, db: Session) -> Optional[str]:
@@ -98,7 +141,20 @@ async def get_bunny_libraries() -> List[Dict]:
         logger.error("BUNNY_STREAM_API_KEY not found in environment variables")
         return []
 
-    # Return cached data if still fresh
+    cached = _fresh_libraries()
+    if cached is not None:
+        return cached
+
+    async with _libraries_fetch_lock:
+        # Another request may have filled the cache while we waited
+        cached = _fresh_libraries()
+        if cached is not None:
+            return cached
+        return await _fetch_bunny_libraries()
+
+
+def _fresh_libraries() -> Optional[List[Dict]]:
+    """Return the cached libraries list if it is still within its TTL."""
     now = datetime.now(pytz.UTC)
     if (
         _libraries_cache["data"] is not None
@@ -110,7 +166,11 @@ async def get_bunny_libraries() -> List[Dict]:
             f"Returning cached libraries ({len(_libraries_cache['data'])} items, fetched {age}s ago)"
         )
         return _libraries_cache["data"]
+    return None
 
+
+async def _fetch_bunny_libraries() -> List[Dict]:
+    """Page through the Bunny library list and refresh the cache."""
     try:
         headers = {
             "AccessKey": BUNNY_STREAM_API_KEY,
@@ -118,81 +178,79 @@ async def get_bunny_libraries() -> List[Dict]:
             "User-Agent": "Python/httpx"
         }
 
-        # Configure client with proper settings for Windows environment
-        async with httpx.AsyncClient(
-            verify=True,
-            timeout=httpx.Timeout(120.0, connect=60.0),
-            follow_redirects=True,
-            limits=httpx.Limits(max_keepalive_connections=5, max_connections=10)
-        ) as client:
-            logger.info("Attempting to connect to Bunny.net API...")
-
-            # Try to fetch with a high perPage to minimize pagination
-            page = 1
-            per_page = 200
-            all_items: List[Dict] = []
-            total_items = None
-
-            while True:
-                try:
-                    response = await client.get(
-                        f"{BUNNY_API_BASE_URL}/videolibrary",
-                        headers=headers,
-                        params={"page": page, "perPage": per_page}
-                    )
-                except Exception as e:
-                    logger.error(f"Error requesting Bunny libraries page {page}: {e}")
-                    break
+        # Listing can be slow with many libraries — allow a longer timeout per request
+        client = get_http_client()
+        list_timeout = httpx.Timeout(120.0, connect=60.0)
+        logger.info("Attempting to connect to Bunny.net API...")
 
-                if response.status_code != 200:
-                    logger.error(f"Failed to fetch libraries (page {page}): {response.status_code} - {response.text}")
-                    break
+        # Try to fetch with a high perPage to minimize pagination
+        page = 1
+        per_page = 200
+        all_items: List[Dict] = []
+        total_items = None
 
-                data = response.json()
-                if isinstance(data, list):
-                    items = data
-                    if page == 1:
-                        all_items = items
-                    else:
-                        all_items.extend(items)
-                    if len(items) < per_page:
-                        break
-                    page += 1
-                    continue
-                elif isinstance(data, dict):
-                    items = data.get("items") or data.get("Items") or data.get("data") or []
-                    if total_items is None:
-                        total_items = data.get("totalItems") or data.get("TotalItems") or data.get("total") or None
-                    if not items:
-                        break
-                    all_items.extend(items)
-                    if total_items is not None and len(all_items) >= int(total_items):
-                        break
-                    page += 1
+        while True:
+            try:
+                response = await client.get(
+                    f"{BUNNY_API_BASE_URL}/videolibrary",
+                    headers=headers,
+                    params={"page": page, "perPage": per_page},
+                    timeout=list_timeout,
+                    follow_redirects=True
+                )
+            except Exception as e:
+                logger.error(f"Error requesting Bunny libraries page {page}: {e}")
+                break
+
+            if response.status_code != 200:
+                logger.error(f"Failed to fetch libraries (page {page}): {response.status_code} - {response.text}")
+                break
+
+            data = response.json()
+            if isinstance(data, list):
+                items = data
+                if page == 1:
+                    all_items = items
                 else:
-                    logger.error("Unexpected Bunny libraries response format")
+                    all_items.extend(items)
+                if len(items) < per_page:
                     break
-
-            logger.info(f"Successfully collected {len(all_items)} libraries from Bunny.net across pages")
-
-            libraries_simplified = []
-            for library in all_items:
-                library_id = library.get("Id") if "Id" in library else library.get("id")
-                library_name = library.get("Name") if "Name" in library else library.get("name")
-                if library_name is None:
-                    library_name = f"Library {library_id}"
-
-                libraries_simplified.append({
-                    "id": library_id,
-                    "name": library_name,
-                    "original_data": library
-                })
-
-            # Save to cache
-            _libraries_cache["data"] = libraries_simplified
-            _libraries_cache["fetched_at"] = datetime.now(pytz.UTC)
-            logger.info(f"Cached {len(libraries_simplified)} libraries")
-            return libraries_simplified
+                page += 1
+                continue
+            elif isinstance(data, dict):
+                items = data.get("items") or data.get("Items") or data.get("data") or []
+                if total_items is None:
+                    total_items = data.get("totalItems") or data.get("TotalItems") or data.get("total") or None
+                if not items:
+                    break
+                all_items.extend(items)
+                if total_items is not None and len(all_items) >= int(total_items):
+                    break
+                page += 1
+            else:
+                logger.error("Unexpected Bunny libraries response format")
+                break
+
+        logger.info(f"Successfully collected {len(all_items)} libraries from Bunny.net across pages")
+
+        libraries_simplified = []
+        for library in all_items:
+            library_id = library.get("Id") if "Id" in library else library.get("id")
+            library_name = library.get("Name") if "Name" in library else library.get("name")
+            if library_name is None:
+                library_name = f"Library {library_id}"
+
+            libraries_simplified.append({
+                "id": library_id,
+                "name": library_name,
+                "original_data": library
+            })
+
+        # Save to cache
+        _libraries_cache["data"] = libraries_simplified
+        _libraries_cache["fetched_at"] = datetime.now(pytz.UTC)
+        logger.info(f"Cached {len(libraries_simplified)} libraries")
+        return libraries_simplified
 
     except httpx.ConnectError as e:
         logger.error(f"Failed to connect to Bunny.net API: {str(e)}")
@@ -214,14 +272,27 @@ async def get_bunny_libraries() -> List[Dict]:
         return []
 
 
-async def get_library_monthly_stats(library_id: int, month: int, year: int, db: Session = None) -> Dict:
+async def get_library_monthly_stats(library_id: int, month: int, year: int, db: Session = None,
+                                    api_key: Optional[str] = None) -> Dict:
     """
     Get monthly statistics for a specific library using library-specific API key
     Returns only accurate view counts and watch time from the Stream API
     Uses precise timezone-aware date ranges for 100% accuracy
+    Pass api_key when the caller already has the library config loaded,
+    so no blocking DB lookup happens on the event loop
     """
+    cache_key = (library_id, year, month)
+    cached = _monthly_stats_cache.get(cache_key)
+    if cached is not None:
+        fetched_at, stats = cached
+        if (datetime.now(BUNNY_TIMEZONE) - fetched_at).total_seconds() < _monthly_stats_ttl(month, year):
+            logger.info(f"Returning cached stats for library {library_id} ({month}/{year})")
+            return dict(stats)
+        _monthly_stats_cache.pop(cache_key, None)
+
     # Get the appropriate API key for this library
-    api_key = get_library_api_key(library_id, db) if db else BUNNY_STREAM_API_KEY
+    if not api_key:
+        api_key = get_library_api_key(library_id, db) if db else BUNNY_STREAM_API_KEY
 
     if not api_key:
         logger.error(f"No API key available for library {library_id}")
@@ -252,74 +323,87 @@ async def get_library_monthly_stats(library_id: int, month: int, year: int, db:
             "hourly": "false"
         }
 
-        async with httpx.AsyncClient(verify=True, timeout=60.0) as client:
-            logger.info(f"Making request to: {BUNNY_STREAM_API_BASE_URL}/library/{library_id}/statistics")
-            logger.info(f"Precise date range: {start_date} to {end_date} (UTC)")
+        client = get_http_client()
+        logger.info(f"Making request to: {BUNNY_STREAM_API_BASE_URL}/library/{library_id}/statistics")
+        logger.info(f"Precise date range: {start_date} to {end_date} (UTC)")
 
-            # First get library info to get the name
-            library_name = f"Library {library_id}"
+        # Library info (for the name) and statistics are independent — fetch both at once
+        library_response, response = await asyncio.gather(
+            client.get(
+                f"{BUNNY_STREAM_API_BASE_URL}/library/{library_id}",
+                headers=headers,
+                timeout=60.0
+            ),
+            client.get(
+                f"{BUNNY_STREAM_API_BASE_URL}/library/{library_id}/statistics",
+                headers=headers,
+                params=params,
+                timeout=60.0
+            ),
+            return_exceptions=True
+        )
+
+        library_name = f"Library {library_id}"
+        if isinstance(library_response, Exception):
+            logger.warning(f"Could not fetch library name for {library_id}: {str(library_response)}")
+        elif library_response.status_code == 200:
             try:
-                library_response = await client.get(
-                    f"{BUNNY_STREAM_API_BASE_URL}/library/{library_id}",
-                    headers=headers
-                )
-                if library_response.status_code == 200:
-                    library_data = library_response.json()
-                    library_name = library_data.get("name", f"Library {library_id}")
+                library_data = library_response.json()
+                library_name = library_data.get("name", f"Library {library_id}")
             except Exception as e:
                 logger.warning(f"Could not fetch library name for {library_id}: {str(e)}")
 
-            response = await client.get(
-                f"{BUNNY_STREAM_API_BASE_URL}/library/{library_id}/statistics",
-                headers=headers,
-                params=params
-            )
+        # Statistics failures keep going through the handlers below
+        if isinstance(response, Exception):
+            raise response
 
-            if response.status_code == 200:
-                data = response.json()
-                logger.info(f"API Response for library {library_id}: {data}")
+        if response.status_code == 200:
+            data = response.json()
+            # The payload holds three daily charts — only format it when debugging
+            logger.debug("API Response for library %s: %s", library_id, data)
 
-                views_chart = data.get("viewsChart", {})
-                watch_time_chart = data.get("watchTimeChart", {})
-                bandwidth_chart = data.get("bandwidthChart", {})
+            views_chart = data.get("viewsChart", {})
+            watch_time_chart = data.get("watchTimeChart", {})
+            bandwidth_chart = data.get("bandwidthChart", {})
 
-                total_views = sum(views_chart.values()) if views_chart else 0
-                total_watch_time_seconds = sum(watch_time_chart.values()) if watch_time_chart else 0
-                total_bandwidth_bytes = sum(bandwidth_chart.values()) if bandwidth_chart else 0
-                bandwidth_gb = total_bandwidth_bytes / (1024 ** 3) if total_bandwidth_bytes > 0 else 0.0
+            total_views = sum(views_chart.values()) if views_chart else 0
+            total_watch_time_seconds = sum(watch_time_chart.values()) if watch_time_chart else 0
+            total_bandwidth_bytes = sum(bandwidth_chart.values()) if bandwidth_chart else 0
+            bandwidth_gb = total_bandwidth_bytes / (1024 ** 3) if total_bandwidth_bytes > 0 else 0.0
 
-                last_updated = datetime.now(BUNNY_TIMEZONE).isoformat()
+            last_updated = datetime.now(BUNNY_TIMEZONE).isoformat()
 
-                logger.info(
-                    f"Library {library_id} stats for {month}/{year}: "
-                    f"{total_views} views, {total_watch_time_seconds} seconds watch time, "
-                    f"{bandwidth_gb:.2f} GB bandwidth"
-                )
+            logger.info(
+                f"Library {library_id} stats for {month}/{year}: "
+                f"{total_views} views, {total_watch_time_seconds} seconds watch time, "
+                f"{bandwidth_gb:.2f} GB bandwidth"
+            )
 
-                return {
-                    "library_name": library_name,
-                    "total_views": total_views,
-                    "total_watch_time_seconds": total_watch_time_seconds,
-                    "bandwidth_gb": bandwidth_gb,
-                    "views_chart": views_chart,
-                    "watch_time_chart": watch_time_chart,
-                    "bandwidth_chart": bandwidth_chart,
-                    "last_updated": last_updated,
-                    "raw_data": data
-                }
-            else:
-                logger.error(f"Failed to fetch stats for library {library_id}: {response.status_code} - {response.text}")
-                return {
-                    "library_name": library_name,
-                    "total_views": 0,
-                    "total_watch_time_seconds": 0,
-                    "bandwidth_gb": 0.0,
-                    "views_chart": {},
-                    "watch_time_chart": {},
-                    "bandwidth_chart": {},
-                    "last_updated": None,
-                    "error": response.text
-                }
+            stats = {
+                "library_name": library_name,
+                "total_views": total_views,
+                "total_watch_time_seconds": total_watch_time_seconds,
+                "bandwidth_gb": bandwidth_gb,
+                "views_chart": views_chart,
+                "watch_time_chart": watch_time_chart,
+                "bandwidth_chart": bandwidth_chart,
+                "last_updated": last_updated
+            }
+            _monthly_stats_cache[cache_key] = (datetime.now(BUNNY_TIMEZONE), stats)
+            return dict(stats)
+        else:
+            logger.error(f"Failed to fetch stats for library {library_id}: {response.status_code} - {response.text}")
+            return {
+                "library_name": library_name,
+                "total_views": 0,
+                "total_watch_time_seconds": 0,
+                "bandwidth_gb": 0.0,
+                "views_chart": {},
+                "watch_time_chart": {},
+                "bandwidth_chart": {},
+                "last_updated": None,
+                "error": response.text
+            }
 
     except httpx.ConnectError as e:
         logger.error(f"Failed to connect to Bunny.net API for library {library_id}: {str(e)}")
@@ -394,32 +478,32 @@ async def get_bunny_stats(library_id: int, start_date: str, end_date: str) -> Di
             "hourly": "false"
         }
 
-        async with httpx.AsyncClient(verify=True, timeout=30.0) as client:
-            response = await client.get(
-                f"{BUNNY_STREAM_API_BASE_URL}/library/{library_id}/statistics",
-                headers=headers,
-                params=params
-            )
+        client = get_http_client()
+        response = await client.get(
+            f"{BUNNY_STREAM_API_BASE_URL}/library/{library_id}/statistics",
+            headers=headers,
+            params=params
+        )
 
-            if response.status_code == 200:
-                data = response.json()
+        if response.status_code == 200:
+            data = response.json()
 
-                views_chart = data.get("viewsChart", {})
-                watch_time_chart = data.get("watchTimeChart", {})
+            views_chart = data.get("viewsChart", {})
+            watch_time_chart = data.get("watchTimeChart", {})
 
-                total_views = sum(views_chart.values()) if views_chart else 0
-                total_watch_time_seconds = sum(watch_time_chart.values()) if watch_time_chart else 0
+            total_views = sum(views_chart.values()) if views_chart else 0
+            total_watch_time_seconds = sum(watch_time_chart.values()) if watch_time_chart else 0
 
-                last_updated = datetime.now(BUNNY_TIMEZONE).isoformat()
+            last_updated = datetime.now(BUNNY_TIMEZONE).isoformat()
 
-                return {
-                    "total_views": total_views,
-                    "total_watch_time_seconds": total_watch_time_seconds,
-                    "last_updated": last_updated
-                }
-            else:
-                logger.error(f"Failed to fetch stats for library {library_id}: {response.status_code} - {response.text}")
-                return {"total_views": 0, "total_watch_time_seconds": 0, "last_updated": None}
+            return {
+                "total_views": total_views,
+                "total_watch_time_seconds": total_watch_time_seconds,
+                "last_updated": last_updated
+            }
+        else:
+            logger.error(f"Failed to fetch stats for library {library_id}: {response.status_code} - {response.text}")
+            return {"total_views": 0, "total_watch_time_seconds": 0, "last_updated": None}
 
     except Exception as e:
         logger.error(f"Error fetching stats for library {library_id}: {str(e)}")
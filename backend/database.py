@@ -10,18 +10,37 @@ load_dotenv()
 # otherwise fall back to local SQLite for development
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# SQL_DEBUG=1 (local only) logs every statement with its rows and makes the
+# hot financial queries raise on any lazy relationship load instead of
+# silently issuing one SELECT per row
+SQL_DEBUG = os.getenv("SQL_DEBUG", "").lower() in ("1", "true", "yes")
+
 if DATABASE_URL:
     # Render sometimes provides "postgres://" but SQLAlchemy needs "postgresql://"
     if DATABASE_URL.startswith("postgres://"):
         DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-    engine = create_engine(DATABASE_URL)
+    # Endpoints hold a session across slow Bunny API calls, so size the pool
+    # above the default 5+10 and drop connections Render may have closed.
+    # values_plus_batch turns ORM flushes of many INSERTs into multi-VALUES
+    # statements (PKs still come back via RETURNING) and batches UPDATEs too
+    engine = create_engine(
+        DATABASE_URL,
+        executemany_mode="values_plus_batch",
+        pool_size=20,
+        max_overflow=20,
+        pool_timeout=30,
+        pool_recycle=1800,
+        pool_pre_ping=True,
+        echo="debug" if SQL_DEBUG else False,
+    )
     print(f"✅ Connected to PostgreSQL database")
 else:
     # Local development: use SQLite
     SQLALCHEMY_DATABASE_URL = "sqlite:///./dashboard.db"
     engine = create_engine(
         SQLALCHEMY_DATABASE_URL,
-        connect_args={"check_same_thread": False}
+        connect_args={"check_same_thread": False},
+        echo="debug" if SQL_DEBUG else False,
     )
     print(f"⚠️  Using local SQLite database (data will not persist on Render)")
 
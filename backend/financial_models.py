@@ -1,6 +1,7 @@
 # FILE: /backend/financial_models.py
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON, UniqueConstraint, Index, text
 from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
 from database import Base
 from datetime import datetime
 import pytz
@@ -84,14 +85,14 @@ class TeacherAssignment(Base):
     id = Column(Integer, primary_key=True, index=True)
     library_id = Column(Integer, nullable=False)
     library_name = Column(String(255), nullable=False)
-    stage_id = Column(Integer, ForeignKey("stages.id"), nullable=False)
+    stage_id = Column(Integer, ForeignKey("stages.id"), nullable=False, index=True)
     section_id = Column(Integer, ForeignKey("sections.id"), nullable=True)
     subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False)
     tax_rate = Column(Float, default=0.0)
     revenue_percentage = Column(Float, default=1.0)
     teacher_profile_id = Column(Integer, ForeignKey("teacher_profiles.id"), nullable=True)
-    created_at = Column(DateTime, default=lambda: datetime.now(pytz.UTC))
-    updated_at = Column(DateTime, default=lambda: datetime.now(pytz.UTC), onupdate=lambda: datetime.now(pytz.UTC))
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     stage = relationship("Stage", back_populates="teacher_assignments")
     section = relationship("Section", back_populates="teacher_assignments")
@@ -99,6 +100,20 @@ class TeacherAssignment(Base):
     payments = relationship("TeacherPayment", back_populates="assignment")
     teacher_profile = relationship("TeacherProfile", back_populates="assignments")
 
+    # One assignment per (library, stage, section, subject). Common subjects have
+    # section_id NULL, which a plain unique index would never treat as equal,
+    # so each case gets its own partial unique index (ON CONFLICT targets).
+    __table_args__ = (
+        Index('uq_assignment_lib_stage_section_subject',
+              'library_id', 'stage_id', 'section_id', 'subject_id', unique=True,
+              postgresql_where=text('section_id IS NOT NULL'),
+              sqlite_where=text('section_id IS NOT NULL')),
+        Index('uq_assignment_lib_stage_subject_common',
+              'library_id', 'stage_id', 'subject_id', unique=True,
+              postgresql_where=text('section_id IS NULL'),
+              sqlite_where=text('section_id IS NULL')),
+    )
+
 class FinancialPeriod(Base):
     """Payment periods"""
     __tablename__ = "financial_periods"
@@ -109,7 +124,7 @@ class FinancialPeriod(Base):
     notes = Column(Text, nullable=True)
     # ── NEW: list of month strings e.g. ["2025-10","2025-11","2025-12"]
     months = Column(JSON, nullable=True, default=list)
-    created_at = Column(DateTime, default=lambda: datetime.now(pytz.UTC))
+    created_at = Column(DateTime, server_default=func.now())
     
     section_revenues = relationship("SectionRevenue", back_populates="period", cascade="all, delete-orphan")
     teacher_payments = relationship("TeacherPayment", back_populates="period", cascade="all, delete-orphan")
@@ -125,13 +140,17 @@ class SectionRevenue(Base):
     section_id = Column(Integer, ForeignKey("sections.id"), nullable=False)
     total_orders = Column(Integer, nullable=False, default=0)
     total_revenue_egp = Column(Float, nullable=False, default=0.0)
-    created_at = Column(DateTime, default=lambda: datetime.now(pytz.UTC))
-    updated_at = Column(DateTime, default=lambda: datetime.now(pytz.UTC), onupdate=lambda: datetime.now(pytz.UTC))
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     period = relationship("FinancialPeriod", back_populates="section_revenues")
     stage = relationship("Stage", back_populates="section_revenues")
     section = relationship("Section", back_populates="section_revenues")
 
+    __table_args__ = (
+        UniqueConstraint('period_id', 'stage_id', 'section_id', name='uq_section_revenue'),
+    )
+
 
 class TeacherPayment(Base):
     """Calculated teacher payments"""
@@ -166,6 +185,18 @@ class TeacherPayment(Base):
     
     period = relationship("FinancialPeriod", back_populates="teacher_payments")
     assignment = relationship("TeacherAssignment", back_populates="payments")
+    # stage/section/subject ids are stored without FK constraints, so these
+    # are read-only joins that exist for eager loading
+    stage = relationship("Stage", primaryjoin="foreign(TeacherPayment.stage_id) == Stage.id", viewonly=True)
+    section = relationship("Section", primaryjoin="foreign(TeacherPayment.section_id) == Section.id", viewonly=True)
+    subject = relationship("Subject", primaryjoin="foreign(TeacherPayment.subject_id) == Subject.id", viewonly=True)
+
+    # Payments are always read and replaced per (period, stage); recalculation
+    # upserts on (period, assignment)
+    __table_args__ = (
+        Index('ix_teacher_payments_period_stage', 'period_id', 'stage_id'),
+        UniqueConstraint('period_id', 'assignment_id', name='uq_teacher_payment_period_assignment'),
+    )
 
 class TeacherProfile(Base):
     """
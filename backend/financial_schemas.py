@@ -1,5 +1,6 @@
 # FILE: /backend/financial_schemas.py
 from pydantic import BaseModel, Field
+from pydantic.utils import GetterDict
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -84,6 +85,22 @@ class TeacherAssignment(TeacherAssignmentBase):
     class Config:
         orm_mode = True
 
+class _AssignmentDetailsGetter(GetterDict):
+    """Resolve the *_name detail fields from the loaded relationships on from_orm."""
+    _related = {
+        "stage_name": ("stage", "name"),
+        "section_name": ("section", "name"),
+        "subject_name": ("subject", "name"),
+        "subject_is_common": ("subject", "is_common"),
+    }
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if key in self._related:
+            relation, attr = self._related[key]
+            related = getattr(self._obj, relation, None)
+            return getattr(related, attr, default) if related is not None else default
+        return super().get(key, default)
+
 class TeacherAssignmentWithDetails(TeacherAssignment):
     stage_name: Optional[str] = None
     section_name: Optional[str] = None
@@ -91,6 +108,9 @@ class TeacherAssignmentWithDetails(TeacherAssignment):
     subject_is_common: Optional[bool] = None
     teacher_profile_code: Optional[str] = None
     teacher_profile_name: Optional[str] = None
+    class Config:
+        orm_mode = True
+        getter_dict = _AssignmentDetailsGetter
     
 # ── AUTO-MATCH ────────────────────────────────────────────────────────────────
 
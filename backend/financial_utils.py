@@ -13,6 +13,7 @@ KEY RULES:
 
 import re
 import logging
+from functools import lru_cache
 from typing import Optional, Tuple
 
 logger = logging.getLogger(__name__)
@@ -60,6 +61,9 @@ def normalize_subject_code(code: str) -> str:
     return SUBJECT_CODE_ALIASES.get(code, code)
 
 
+# Pure function of the name (the code tables above are constants), so repeated
+# auto-match / auto-link runs over the same Bunny catalogue hit the cache
+@lru_cache(maxsize=4096)
 def parse_library_name(library_name: str) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str], Optional[str]]:
     """
     Parse a Bunny library name into
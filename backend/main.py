@@ -1,13 +1,27 @@
 from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Form
-from sqlalchemy import text
+from sqlalchemy import text, literal_column, insert, select, update, delete, or_, func, tuple_, lambda_stmt
+from sqlalchemy.dialects.postgresql import insert as pg_insert, JSONB
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, aliased, load_only, selectinload, raiseload
 from typing import List
+import asyncio
+import pydantic
+import itertools
+import json
 import logging
+from contextlib import contextmanager
+from types import SimpleNamespace
+from operator import attrgetter
 from passlib.context import CryptContext
+import bcrypt
 from jose import jwt, JWTError
 from fastapi.security import OAuth2PasswordBearer
-from datetime import datetime, timedelta
+from datetime import datetime, date, time, timedelta, timezone
+from decimal import Decimal
 from dateutil.relativedelta import relativedelta
 import os
 from dotenv import load_dotenv
@@ -18,8 +32,8 @@ load_dotenv()
 import models
 import schemas
 import pytz
-from database import engine, get_db, SessionLocal
-from bunny_service import get_bunny_stats, get_bunny_libraries, get_library_monthly_stats
+from database import engine, get_db, SessionLocal, SQL_DEBUG
+from bunny_service import get_bunny_stats, get_bunny_libraries, get_library_monthly_stats, clear_monthly_stats_cache, get_http_client, close_http_client, BUNNY_STREAM_API_KEY
 
 from financial_models import (
     Stage, Section, Subject, StageSectionSubject,
@@ -35,12 +49,11 @@ from financial_schemas import (
     TeacherAssignment as TeacherAssignmentSchema,
     TeacherAssignmentCreate, TeacherAssignmentUpdate,
     TeacherAssignmentWithDetails,
-    AutoMatchResponse, AutoMatchResult,
+    AutoMatchResponse,
     FinancialPeriod as FinancialPeriodSchema,
     FinancialPeriodCreate, FinancialPeriodUpdate,
     SectionRevenue as SectionRevenueSchema,
     SectionRevenueCreate, SectionRevenueUpdate,
-    SectionRevenueWithDetails,
     TeacherPaymentWithDetails,
     FinancialData,
     CalculatePaymentsRequest,
@@ -62,6 +75,11 @@ from financial_utils import parse_library_name, calculate_teacher_payment, calcu
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Every response_model is validated on the request path; the pure-Python
+# pydantic build (e.g. installed with --no-binary) is several times slower
+if not pydantic.compiled:
+    logger.warning("⚠️  pydantic is not compiled — install the binary wheel for faster validation")
+
 # Create ALL database tables on startup
 try:
     logger.info("Creating main database tables...")
@@ -150,6 +168,105 @@ try:
             """))
             logger.info("✅ Created library_exclusions table")
 
+        conn.execute(sql_text(
+            "CREATE INDEX IF NOT EXISTS ix_lhs_lib_year_month "
+            "ON library_historical_stats (library_id, year, month)"
+        ))
+        logger.info("✅ Ensured ix_lhs_lib_year_month index")
+
+        conn.execute(sql_text(
+            "CREATE INDEX IF NOT EXISTS ix_lhs_month_year_synced "
+            "ON library_historical_stats (month, year, is_synced)"
+        ))
+        logger.info("✅ Ensured ix_lhs_month_year_synced index")
+
+        conn.execute(sql_text(
+            "CREATE INDEX IF NOT EXISTS ix_monthly_stats_teacher_year_month "
+            "ON monthly_stats (teacher_id, year, month)"
+        ))
+        logger.info("✅ Ensured ix_monthly_stats_teacher_year_month index")
+
+        conn.execute(sql_text(
+            "CREATE INDEX IF NOT EXISTS ix_teacher_assignments_stage_id "
+            "ON teacher_assignments (stage_id)"
+        ))
+        conn.execute(sql_text(
+            "CREATE INDEX IF NOT EXISTS ix_teacher_payments_period_stage "
+            "ON teacher_payments (period_id, stage_id)"
+        ))
+        logger.info("✅ Ensured teacher assignment/payment lookup indexes")
+
+        # Chart columns were created as JSON — convert them to JSONB
+        for chart_col in ("views_chart", "watch_time_chart", "bandwidth_chart"):
+            result = conn.execute(sql_text(
+                "SELECT data_type FROM information_schema.columns "
+                f"WHERE table_name='library_historical_stats' AND column_name='{chart_col}'"
+            )).fetchone()
+            if result and result[0] == "json":
+                logger.info(f"Converting library_historical_stats.{chart_col} to JSONB...")
+                conn.execute(sql_text(
+                    f"ALTER TABLE library_historical_stats "
+                    f"ALTER COLUMN {chart_col} TYPE JSONB USING {chart_col}::jsonb"
+                ))
+                logger.info(f"✅ Converted {chart_col} to JSONB")
+
+        # Older databases predate uq_library_month_year — the stats upserts rely on it
+        result = conn.execute(sql_text(
+            "SELECT constraint_name FROM information_schema.table_constraints "
+            "WHERE table_name='library_historical_stats' AND constraint_name='uq_library_month_year'"
+        )).fetchone()
+        if not result:
+            try:
+                with conn.begin_nested():
+                    conn.execute(sql_text(
+                        "ALTER TABLE library_historical_stats "
+                        "ADD CONSTRAINT uq_library_month_year UNIQUE (library_id, month, year)"
+                    ))
+                logger.info("✅ Added uq_library_month_year constraint")
+            except Exception as uq_err:
+                logger.warning(f"⚠️ Could not add uq_library_month_year (duplicate rows?): {uq_err}")
+
+        # Timestamps on these tables are generated by the database now
+        for ts_table, ts_col in (
+            ("teacher_assignments", "created_at"), ("teacher_assignments", "updated_at"),
+            ("section_revenues", "created_at"), ("section_revenues", "updated_at"),
+            ("financial_periods", "created_at"),
+            ("library_configs", "created_at"), ("library_configs", "updated_at"),
+            ("users", "created_at"), ("users", "updated_at"),
+            ("monthly_stats", "created_at"), ("monthly_stats", "updated_at"),
+            ("library_historical_stats", "fetch_date"),
+            ("library_historical_stats", "created_at"), ("library_historical_stats", "updated_at"),
+        ):
+            conn.execute(sql_text(f"ALTER TABLE {ts_table} ALTER COLUMN {ts_col} SET DEFAULT NOW()"))
+        logger.info("✅ Ensured server-side timestamp defaults")
+
+        # Upsert targets for teacher assignments, section revenues, payments and monthly stats
+        for uq_name, uq_sql in (
+            ("uq_assignment_lib_stage_section_subject",
+             "CREATE UNIQUE INDEX IF NOT EXISTS uq_assignment_lib_stage_section_subject "
+             "ON teacher_assignments (library_id, stage_id, section_id, subject_id) "
+             "WHERE section_id IS NOT NULL"),
+            ("uq_assignment_lib_stage_subject_common",
+             "CREATE UNIQUE INDEX IF NOT EXISTS uq_assignment_lib_stage_subject_common "
+             "ON teacher_assignments (library_id, stage_id, subject_id) "
+             "WHERE section_id IS NULL"),
+            ("uq_section_revenue",
+             "CREATE UNIQUE INDEX IF NOT EXISTS uq_section_revenue "
+             "ON section_revenues (period_id, stage_id, section_id)"),
+            ("uq_monthly_stats_teacher_month_year",
+             "CREATE UNIQUE INDEX IF NOT EXISTS uq_monthly_stats_teacher_month_year "
+             "ON monthly_stats (teacher_id, month, year)"),
+            ("uq_teacher_payment_period_assignment",
+             "CREATE UNIQUE INDEX IF NOT EXISTS uq_teacher_payment_period_assignment "
+             "ON teacher_payments (period_id, assignment_id)"),
+        ):
+            try:
+                with conn.begin_nested():
+                    conn.execute(sql_text(uq_sql))
+                logger.info(f"✅ Ensured {uq_name} index")
+            except Exception as uq_err:
+                logger.warning(f"⚠️ Could not create {uq_name} (duplicate rows?): {uq_err}")
+
     logger.info("✅ Financial table migrations complete")
 
 except Exception as e:
@@ -165,7 +282,11 @@ async def startup_event():
         logger.info(f"✅ Startup cache ready: {len(libs)} libraries loaded")
     except Exception as e:
         logger.warning(f"⚠️ Startup cache pre-warm failed (non-fatal): {e}")
-        
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_http_client()
+
 def custom_openapi():
     if app.openapi_schema:
         return app.openapi_schema
@@ -219,6 +340,7 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+_AUTH_USER_COLS = load_only(models.User.id, models.User.email, models.User.is_active, models.User.token_version)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -247,7 +369,9 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.id == int(user_id)).first()
+    # Runs on every request: load only what the checks below and the endpoints
+    # use, not the password hash or the allowed_pages JSON
+    user = db.query(models.User).options(_AUTH_USER_COLS).filter(models.User.id == int(user_id)).first()
     if user is None or not user.is_active:
         raise credentials_exception
     # If token has a version, validate it matches current
@@ -256,13 +380,11 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     return user
     
 def hash_password(password: str) -> str:
-    import bcrypt
     raw = password.encode("utf-8")[:72]
     return bcrypt.hashpw(raw, bcrypt.gensalt()).decode("utf-8")
     
 def verify_password(password: str, password_hash: str) -> bool:
     try:
-        import bcrypt
         return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
     except Exception:
         try:
@@ -347,14 +469,22 @@ def read_teacher(teacher_id: int, db: Session = Depends(get_db), current_user: m
     return db_teacher
 
 
+# lambda_stmt only resolves mapped classes referenced as plain globals, not
+# as attributes of the models module
+_MonthlyStats = models.MonthlyStats
+
+
 @app.get("/teachers/{teacher_id}/monthly-stats", response_model=List[schemas.MonthlyStats])
 def get_teacher_monthly_stats(teacher_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     db_teacher = db.query(models.Teacher).filter(models.Teacher.id == teacher_id).first()
     if db_teacher is None:
         raise HTTPException(status_code=404, detail="Teacher not found")
-    return db.query(models.MonthlyStats).filter(
-        models.MonthlyStats.teacher_id == teacher_id
-    ).order_by(models.MonthlyStats.year.desc(), models.MonthlyStats.month.desc()).all()
+    # The statement is built and cached on first use; later calls only swap
+    # the teacher_id bind value instead of rebuilding the SELECT
+    stmt = lambda_stmt(lambda: select(_MonthlyStats))
+    stmt += lambda s: s.where(_MonthlyStats.teacher_id == teacher_id)
+    stmt += lambda s: s.order_by(_MonthlyStats.year.desc(), _MonthlyStats.month.desc())
+    return db.execute(stmt).scalars().all()
 
 
 # ============================================
@@ -386,6 +516,29 @@ async def fetch_bunny_libraries(db: Session = Depends(get_db), current_user: mod
         logger.error(f"Error in fetch_bunny_libraries: {str(e)}")
         return []
 
+# Bunny requests in flight at once for one batch of libraries
+BUNNY_FETCH_CONCURRENCY = 20
+
+
+async def _fetch_monthly_stats_many(library_ids, month: int, year: int, api_keys: dict) -> dict:
+    """
+    Fetch month stats for every distinct library concurrently, at most
+    BUNNY_FETCH_CONCURRENCY at a time over the shared client. Returns
+    library_id → stats dict, or the exception its fetch raised.
+    """
+    semaphore = asyncio.Semaphore(BUNNY_FETCH_CONCURRENCY)
+
+    async def fetch_one(library_id):
+        async with semaphore:
+            return await get_library_monthly_stats(
+                library_id, month, year, api_key=api_keys.get(library_id) or BUNNY_STREAM_API_KEY
+            )
+
+    unique_ids = list(dict.fromkeys(library_ids))
+    results = await asyncio.gather(*(fetch_one(library_id) for library_id in unique_ids), return_exceptions=True)
+    return dict(zip(unique_ids, results))
+
+
 @app.post("/bunny-libraries/sync-stats/")
 async def sync_library_stats(request: dict, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     try:
@@ -397,10 +550,18 @@ async def sync_library_stats(request: dict, db: Session = Depends(get_db), curre
             raise HTTPException(status_code=400, detail="No library IDs provided")
 
         synced_libraries = []
+        fetched = {}  # library_id → (views, watch_time_seconds)
+
+        api_keys = dict(db.query(models.LibraryConfig.library_id, models.LibraryConfig.stream_api_key).filter(
+            models.LibraryConfig.library_id.in_(library_ids)
+        ).all())
+        stats_by_library = await _fetch_monthly_stats_many(library_ids, month, year, api_keys)
 
         for library_id in library_ids:
             try:
-                stats_data = await get_library_monthly_stats(library_id, month, year, db)
+                stats_data = stats_by_library[library_id]
+                if isinstance(stats_data, Exception):
+                    raise stats_data
                 if not stats_data or "error" in stats_data:
                     logger.error(f"Failed to get stats for library {library_id} - skipping")
                     continue
@@ -408,29 +569,7 @@ async def sync_library_stats(request: dict, db: Session = Depends(get_db), curre
                 views = stats_data.get("total_views", 0)
                 watch_time_seconds = stats_data.get("total_watch_time_seconds", 0)
                 last_updated = stats_data.get("last_updated")
-
-                teacher = db.query(models.Teacher).filter(models.Teacher.bunny_library_id == library_id).first()
-                if not teacher:
-                    cfg = db.query(models.LibraryConfig).filter(models.LibraryConfig.library_id == library_id).first()
-                    display_name = (cfg.library_name if cfg and cfg.library_name else f"Library {library_id}")
-                    teacher = models.Teacher(name=display_name, bunny_library_id=library_id)
-                    db.add(teacher)
-                    db.flush()   # assigns the ID without committing
-
-                existing_stat = db.query(models.MonthlyStats).filter(
-                    models.MonthlyStats.teacher_id == teacher.id,
-                    models.MonthlyStats.month == month,
-                    models.MonthlyStats.year == year
-                ).first()
-
-                if existing_stat:
-                    existing_stat.video_views = views
-                    existing_stat.total_watch_time_seconds = watch_time_seconds
-                else:
-                    db.add(models.MonthlyStats(
-                        teacher_id=teacher.id, month=month, year=year,
-                        video_views=views, total_watch_time_seconds=watch_time_seconds
-                    ))
+                fetched[library_id] = (views, watch_time_seconds)
 
                 synced_libraries.append({"library_id": library_id, "views": views,
                                          "watch_time_seconds": watch_time_seconds, "last_updated": last_updated})
@@ -438,6 +577,8 @@ async def sync_library_stats(request: dict, db: Session = Depends(get_db), curre
                 logger.error(f"Error syncing stats for library {library_id}: {str(e)}")
                 continue
 
+        if fetched:
+            _upsert_monthly_stats(db, fetched, month, year)
         db.commit()
         return {"message": f"Successfully synced statistics for {len(synced_libraries)} libraries",
                 "count": len(synced_libraries), "synced_libraries": synced_libraries}
@@ -447,6 +588,51 @@ async def sync_library_stats(request: dict, db: Session = Depends(get_db), curre
         logger.error(f"Error in sync_library_stats: {str(e)}")
         raise HTTPException(status_code=500, detail="An internal server error occurred. Please try again.")
 
+
+def _upsert_monthly_stats(db: Session, fetched: dict, month: int, year: int):
+    """
+    Write one MonthlyStats row per library for month/year, creating missing
+    Teacher rows on the way: one INSERT ... ON CONFLICT per table (per 1000
+    rows) instead of a lookup, flush and insert/update per library.
+    """
+    lib_ids = list(fetched)
+    config_names = dict(db.query(models.LibraryConfig.library_id, models.LibraryConfig.library_name).filter(
+        models.LibraryConfig.library_id.in_(lib_ids)
+    ).all())
+
+    # The no-op DO UPDATE keeps existing names but makes RETURNING hand back
+    # the id of every teacher, not just the newly inserted ones
+    teachers = models.Teacher.__table__
+    teacher_ids = {}
+    for i in range(0, len(lib_ids), 1000):
+        stmt = pg_insert(teachers).values([
+            {"bunny_library_id": lib_id, "name": config_names.get(lib_id) or f"Library {lib_id}"}
+            for lib_id in lib_ids[i:i + 1000]
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["bunny_library_id"],
+            set_={"name": teachers.c.name},
+        ).returning(teachers.c.bunny_library_id, teachers.c.id)
+        teacher_ids.update(db.execute(stmt).all())
+
+    monthly = models.MonthlyStats.__table__
+    rows = [
+        {"teacher_id": teacher_ids[lib_id], "month": month, "year": year,
+         "video_views": views, "total_watch_time_seconds": watch_time_seconds}
+        for lib_id, (views, watch_time_seconds) in fetched.items()
+    ]
+    for i in range(0, len(rows), 1000):
+        stmt = pg_insert(monthly).values(rows[i:i + 1000])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=["teacher_id", "month", "year"],
+            set_={
+                "video_views": stmt.excluded.video_views,
+                "total_watch_time_seconds": stmt.excluded.total_watch_time_seconds,
+                "updated_at": func.now(),
+            },
+        ))
+
+
 @app.post("/bunny-libraries/raw-api-response/")
 async def get_raw_api_response(request: dict, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     try:
@@ -457,23 +643,21 @@ async def get_raw_api_response(request: dict, db: Session = Depends(get_db), cur
         if not library_id or not start_date or not end_date:
             raise HTTPException(status_code=400, detail="Missing required parameters")
 
-        import httpx
-        BUNNY_STREAM_API_KEY = os.getenv("BUNNY_STREAM_API_KEY")
         if not BUNNY_STREAM_API_KEY:
             raise HTTPException(status_code=500, detail="API key not configured")
 
         headers = {"AccessKey": BUNNY_STREAM_API_KEY, "Content-Type": "application/json"}
         params = {"dateFrom": start_date, "dateTo": end_date, "hourly": "false"}
 
-        async with httpx.AsyncClient(verify=True, timeout=30.0) as client:
-            response = await client.get(
-                f"https://video.bunnycdn.com/library/{library_id}/statistics",
-                headers=headers, params=params
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(status_code=response.status_code, detail=response.text)
+        # Shared pooled client — reuses the keep-alive connections to Bunny
+        response = await get_http_client().get(
+            f"https://video.bunnycdn.com/library/{library_id}/statistics",
+            headers=headers, params=params
+        )
+        if response.status_code == 200:
+            return response.json()
+        else:
+            raise HTTPException(status_code=response.status_code, detail=response.text)
 
     except Exception as e:
         logger.error(f"Error getting raw API response: {str(e)}")
@@ -525,11 +709,10 @@ def update_user(user_id: int, update: schemas.UserUpdate, db: Session = Depends(
 
 @app.delete("/users/{user_id}")
 def delete_user(user_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    db.delete(db_user)
+    result = db.execute(delete(models.User).where(models.User.id == user_id))
     db.commit()
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="User not found")
     return {"success": True}
 
 
@@ -538,7 +721,12 @@ def login(req: schemas.LoginRequest, db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.email == req.email).first()
     if not user or not user.is_active or not verify_password(req.password, user.password_hash):
         raise HTTPException(status_code=401, detail="Invalid credentials")
-        
+    # Hashes made with an older scheme or fewer rounds are upgraded the next
+    # time the plain password is at hand
+    if _pwd_context.needs_update(user.password_hash):
+        user.password_hash = hash_password(req.password)
+        db.commit()
+
     access_token = create_access_token_for_user(user)
     
     return schemas.LoginResponse(
@@ -549,12 +737,16 @@ def login(req: schemas.LoginRequest, db: Session = Depends(get_db)):
 
 @app.post("/users/{user_id}/force-logout")
 def force_logout_user(user_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not db_user:
+    # Bump the version in place; no need to load (and decode) the whole user row
+    email = db.execute(
+        update(models.User).where(models.User.id == user_id).values(
+            token_version=func.coalesce(models.User.token_version, 1) + 1
+        ).returning(models.User.email).execution_options(synchronize_session=False)
+    ).scalar()
+    if email is None:
         raise HTTPException(status_code=404, detail="User not found")
-    db_user.token_version = (db_user.token_version or 1) + 1
     db.commit()
-    return {"success": True, "message": f"User {db_user.email} has been logged out"}
+    return {"success": True, "message": f"User {email} has been logged out"}
     
 # ============================================
 # LIBRARY CONFIGURATIONS
@@ -715,8 +907,10 @@ async def sync_library_configs_from_bunny(db: Session = Depends(get_db), current
 # ============================================
 # CACHE MANAGEMENT
 # ============================================
+# "data" holds the rendered JSON body, "count" the number of libraries in it
 _historical_stats_cache = {
     "data": None,
+    "count": 0,
     "fetched_at": None,
     "ttl_seconds": 600,
     "cache_key": None
@@ -731,6 +925,8 @@ async def clear_libraries_cache(current_user: models.User = Depends(get_current_
     _historical_stats_cache["data"] = None
     _historical_stats_cache["fetched_at"] = None
     _historical_stats_cache["cache_key"] = None
+    _invalidate_reference_cache("stages:", "sections:", "subjects:", "periods:")
+    clear_monthly_stats_cache()
     logger.info(f"Libraries + historical stats cache cleared by user {current_user.email}")
     return {"success": True, "message": "Cache cleared. Next fetch will go directly to Bunny API."}
     
@@ -895,84 +1091,124 @@ def read_root():
 # HISTORICAL STATS
 # ============================================
 
+# Columns overwritten when a re-fetch hits an existing (library_id, month, year) row
+_HISTORICAL_STATS_UPSERT_COLUMNS = (
+    "total_views", "total_watch_time_seconds", "bandwidth_gb",
+    "views_chart", "watch_time_chart", "bandwidth_chart",
+    "library_name", "fetch_date", "updated_at",
+)
+
 @app.post("/historical-stats/batch-fetch/", response_model=schemas.BatchFetchResponse)
 async def batch_fetch_library_stats(request: schemas.BatchFetchRequest, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     try:
-        results = []
+        # db is the Session get_current_user already used — hand its connection back
+        # now. Each DB step below opens its own short-lived session, so no pooled
+        # connection is held while waiting on Bunny.
+        await run_in_threadpool(db.close)
+
+        now = datetime.now(timezone.utc)
+        pending_results = []
         successful_fetches = 0
         failed_fetches = 0
         skipped_fetches = 0
 
-        for library_id in request.library_ids:
-            try:
-                existing_stats = db.query(models.LibraryHistoricalStats).filter(
-                    models.LibraryHistoricalStats.library_id == library_id,
-                    models.LibraryHistoricalStats.month == request.month,
-                    models.LibraryHistoricalStats.year == request.year
-                ).first()
+        def load_configs():
+            # Detached configs keep their loaded attributes after the session closes
+            with SessionLocal() as session:
+                return {
+                    c.library_id: c for c in session.query(models.LibraryConfig).filter(
+                        models.LibraryConfig.library_id.in_(request.library_ids)
+                    ).all()
+                }
 
-                stats_data = await get_library_monthly_stats(library_id, request.month, request.year, db)
+        # DB work runs in the threadpool so the sync Session never blocks the event loop
+        configs_by_library = await run_in_threadpool(load_configs)
 
-                try:
-                    cfg = db.query(models.LibraryConfig).filter(models.LibraryConfig.library_id == library_id).first()
-                    display_name = (cfg.library_name if cfg and cfg.library_name
-                                    else stats_data.get("library_name", f"Library {library_id}"))
-                except Exception:
-                    display_name = stats_data.get("library_name", f"Library {library_id}")
-
-                if existing_stats:
-                    existing_stats.total_views = stats_data.get("total_views", 0)
-                    existing_stats.total_watch_time_seconds = stats_data.get("total_watch_time_seconds", 0)
-                    existing_stats.bandwidth_gb = stats_data.get("bandwidth_gb", 0.0)
-                    existing_stats.views_chart = stats_data.get("views_chart", {})
-                    existing_stats.watch_time_chart = stats_data.get("watch_time_chart", {})
-                    existing_stats.bandwidth_chart = stats_data.get("bandwidth_chart", {})
-                    existing_stats.library_name = display_name
-                    existing_stats.fetch_date = datetime.now(pytz.UTC)
-                    existing_stats.updated_at = datetime.now(pytz.UTC)
-                    db.commit()
-                    db.refresh(existing_stats)
-                    results.append(schemas.LibraryFetchStatus(
-                        library_id=library_id, library_name=display_name,
-                        status="success", success=True, message="Updated existing data", data=existing_stats
-                    ))
-                else:
-                    new_stats = models.LibraryHistoricalStats(
-                        library_id=library_id, library_name=display_name,
-                        month=request.month, year=request.year,
-                        total_views=stats_data.get("total_views", 0),
-                        total_watch_time_seconds=stats_data.get("total_watch_time_seconds", 0),
-                        bandwidth_gb=stats_data.get("bandwidth_gb", 0.0),
-                        views_chart=stats_data.get("views_chart", {}),
-                        watch_time_chart=stats_data.get("watch_time_chart", {}),
-                        bandwidth_chart=stats_data.get("bandwidth_chart", {}),
-                        fetch_date=datetime.now(pytz.UTC), is_synced=False
-                    )
-                    db.add(new_stats)
-                    db.commit()
-                    db.refresh(new_stats)
-                    results.append(schemas.LibraryFetchStatus(
-                        library_id=library_id, library_name=display_name,
-                        status="success", success=True, message="Fetched new data", data=new_stats
-                    ))
+        upsert_rows = {}  # library_id → row payload (dedupes repeated ids)
+
+        stats_by_library = await _fetch_monthly_stats_many(
+            request.library_ids, request.month, request.year,
+            {lib_id: cfg.stream_api_key for lib_id, cfg in configs_by_library.items()}
+        )
 
+        for library_id in request.library_ids:
+            try:
+                cfg = configs_by_library.get(library_id)
+                stats_data = stats_by_library[library_id]
+                if isinstance(stats_data, Exception):
+                    raise stats_data
+
+                display_name = (cfg.library_name if cfg and cfg.library_name
+                                else stats_data.get("library_name", f"Library {library_id}"))
+
+                upsert_rows[library_id] = {
+                    "library_id": library_id, "library_name": display_name,
+                    "month": request.month, "year": request.year,
+                    "total_views": stats_data.get("total_views", 0),
+                    "total_watch_time_seconds": stats_data.get("total_watch_time_seconds", 0),
+                    "bandwidth_gb": stats_data.get("bandwidth_gb", 0.0),
+                    "views_chart": stats_data.get("views_chart", {}),
+                    "watch_time_chart": stats_data.get("watch_time_chart", {}),
+                    "bandwidth_chart": stats_data.get("bandwidth_chart", {}),
+                    "fetch_date": now, "is_synced": False,
+                    "created_at": now, "updated_at": now,
+                }
+                pending_results.append(dict(
+                    library_id=library_id, library_name=display_name,
+                    status="success", success=True, message="Fetched new data"
+                ))
                 successful_fetches += 1
 
             except Exception as e:
                 logger.error(f"Failed to fetch stats for library {library_id}: {str(e)}")
-                results.append(schemas.LibraryFetchStatus(
+                pending_results.append(dict(
                     library_id=library_id, library_name=f"Library {library_id}",
                     status="error", success=False, message=f"Failed to fetch: {str(e)}", error=str(e)
                 ))
                 failed_fetches += 1
 
-        return schemas.BatchFetchResponse(
+        # Single INSERT ... ON CONFLICT DO UPDATE for the whole batch.
+        # RETURNING gives back the stored rows; xmax = 0 only for freshly inserted ones.
+        # Chunked at 1000 rows to stay well under Postgres' bind-parameter limit.
+        def upsert_stats():
+            stats_table = models.LibraryHistoricalStats.__table__
+            rows = list(upsert_rows.values())
+            stored = {}
+            with SessionLocal() as session:
+                for i in range(0, len(rows), 1000):
+                    stmt = pg_insert(stats_table).values(rows[i:i + 1000])
+                    stmt = stmt.on_conflict_do_update(
+                        index_elements=["library_id", "month", "year"],
+                        set_={col: stmt.excluded[col] for col in _HISTORICAL_STATS_UPSERT_COLUMNS},
+                    ).returning(*stats_table.c, literal_column("xmax = 0").label("inserted"))
+                    for row in session.execute(stmt):
+                        row_data = dict(row._mapping)
+                        inserted = row_data.pop("inserted")
+                        stored[row_data["library_id"]] = (row_data, inserted)
+                session.commit()
+            return stored
+
+        stored_rows = await run_in_threadpool(upsert_stats) if upsert_rows else {}
+
+        results = []
+        for r in pending_results:
+            stored = stored_rows.get(r["library_id"]) if r["success"] else None
+            if stored:
+                row_data, inserted = stored
+                r["data"] = row_data
+                if not inserted:
+                    r["message"] = "Updated existing data"
+            results.append(schemas.LibraryFetchStatus.construct(**r))
+
+        # Results are built from our own RETURNING rows, so skip validating them
+        # here and again against response_model — encode once and return
+        return JSONResponse(content=jsonable_encoder(schemas.BatchFetchResponse.construct(
             success=successful_fetches > 0,
             message=f"Fetched stats for {successful_fetches}/{len(request.library_ids)} libraries",
             total_libraries=len(request.library_ids),
             successful_fetches=successful_fetches, failed_fetches=failed_fetches,
             skipped_fetches=skipped_fetches, results=results
-        )
+        )))
 
     except Exception as e:
         logger.error(f"Batch fetch error: {str(e)}")
@@ -981,8 +1217,9 @@ async def batch_fetch_library_stats(request: schemas.BatchFetchRequest, db: Sess
 
 
 @app.post("/historical-stats/sync/", response_model=schemas.SyncResponse)
-async def sync_historical_stats(request: schemas.SyncRequest, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def sync_historical_stats(request: schemas.SyncRequest, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     try:
+        now = datetime.now(timezone.utc)
         logger.info("=" * 60)
         logger.info("SYNC TO LIBRARIES PAGE - REQUEST RECEIVED")
         logger.info(f"Library IDs: {request.library_ids}, Month: {request.month}, Year: {request.year}")
@@ -993,27 +1230,26 @@ async def sync_historical_stats(request: schemas.SyncRequest, db: Session = Depe
         failed_syncs = 0
         already_synced = 0
 
-        query = db.query(models.LibraryHistoricalStats)
+        lhs = models.LibraryHistoricalStats
         if request.library_ids:
-            query = query.filter(
-                models.LibraryHistoricalStats.library_id.in_(request.library_ids),
-                models.LibraryHistoricalStats.month == request.month,
-                models.LibraryHistoricalStats.year == request.year
-            )
+            conditions = (lhs.library_id.in_(request.library_ids),
+                          lhs.month == request.month, lhs.year == request.year)
         else:
-            query = query.filter(
-                models.LibraryHistoricalStats.month == request.month,
-                models.LibraryHistoricalStats.year == request.year,
-                models.LibraryHistoricalStats.is_synced == False
-            )
-
-        stats_to_sync = query.all()
+            conditions = (lhs.month == request.month, lhs.year == request.year, lhs.is_synced == False)
+
+        # Flag the rows and read back what the response needs in one UPDATE ... RETURNING,
+        # instead of loading ORM objects and then updating them by id
+        stats_to_sync = db.execute(
+            update(lhs).where(*conditions).values(is_synced=True, sync_date=now, updated_at=now).returning(
+                lhs.library_id, lhs.library_name, lhs.total_views, lhs.total_watch_time_seconds
+            ).execution_options(synchronize_session=False)
+        ).all()
 
         if len(stats_to_sync) == 0:
             logger.warning("NO STATS FOUND TO SYNC!")
             if request.library_ids:
-                any_stats = db.query(models.LibraryHistoricalStats).filter(
-                    models.LibraryHistoricalStats.library_id.in_(request.library_ids)
+                any_stats = db.query(lhs.month, lhs.year).filter(
+                    lhs.library_id.in_(request.library_ids)
                 ).all()
                 if len(any_stats) == 0:
                     raise HTTPException(status_code=404,
@@ -1028,44 +1264,39 @@ async def sync_historical_stats(request: schemas.SyncRequest, db: Session = Depe
 
         logger.info(f"Found {len(stats_to_sync)} stats to sync")
 
-        for stats in stats_to_sync:
-            try:
-                stats.is_synced = True
-                stats.sync_date = datetime.now(pytz.UTC)
-                stats.updated_at = datetime.now(pytz.UTC)
-
-                try:
-                    teacher = db.query(models.Teacher).filter(
-                        models.Teacher.bunny_library_id == stats.library_id).first()
-                    cfg = db.query(models.LibraryConfig).filter(
-                        models.LibraryConfig.library_id == stats.library_id).first()
-                    display_name = (cfg.library_name if cfg and cfg.library_name
-                                    else stats.library_name or f"Library {stats.library_id}")
-                    if teacher:
-                        if teacher.name != display_name:
-                            logger.info(f"Updating teacher name: {teacher.name} → {display_name}")
-                            teacher.name = display_name
-                    else:
-                        logger.info(f"Creating new teacher: {display_name}")
-                        db.add(models.Teacher(name=display_name, bunny_library_id=stats.library_id))
-                except Exception as teacher_err:
-                    logger.error(f"Teacher upsert failed for library {stats.library_id}: {str(teacher_err)}")
-
-                results.append(schemas.LibrarySyncStatus(
-                    library_id=stats.library_id, library_name=stats.library_name,
-                    status="synced", success=True,
-                    message=f"Synced successfully - {stats.total_views} views, {stats.total_watch_time_seconds} seconds"
+        # Upsert one teacher per library in a single statement
+        lib_ids = {stats.library_id for stats in stats_to_sync}
+        config_names = {
+            cfg.library_id: cfg.library_name
+            for cfg in db.query(models.LibraryConfig).filter(models.LibraryConfig.library_id.in_(lib_ids)).all()
+        }
+        teacher_rows = {
+            stats.library_id: {
+                "bunny_library_id": stats.library_id,
+                "name": config_names.get(stats.library_id) or stats.library_name or f"Library {stats.library_id}"
+            }
+            for stats in stats_to_sync
+        }
+        try:
+            with db.begin_nested():
+                teachers_table = models.Teacher.__table__
+                stmt = pg_insert(teachers_table).values(list(teacher_rows.values()))
+                db.execute(stmt.on_conflict_do_update(
+                    index_elements=["bunny_library_id"],
+                    set_={"name": stmt.excluded.name},
+                    where=teachers_table.c.name != stmt.excluded.name
                 ))
-                synced_libraries += 1
-                logger.info(f"✓ Synced library {stats.library_id}: {stats.library_name}")
+        except Exception as teacher_err:
+            logger.error(f"Teacher upsert failed for libraries {sorted(lib_ids)}: {str(teacher_err)}")
 
-            except Exception as e:
-                logger.error(f"Failed to sync library {stats.library_id}: {str(e)}")
-                results.append(schemas.LibrarySyncStatus(
-                    library_id=stats.library_id, library_name=stats.library_name,
-                    status="error", success=False, message=f"Sync failed: {str(e)}", error=str(e)
-                ))
-                failed_syncs += 1
+        for stats in stats_to_sync:
+            results.append(schemas.LibrarySyncStatus(
+                library_id=stats.library_id, library_name=stats.library_name,
+                status="synced", success=True,
+                message=f"Synced successfully - {stats.total_views} views, {stats.total_watch_time_seconds} seconds"
+            ))
+            synced_libraries += 1
+            logger.info(f"✓ Synced library {stats.library_id}: {stats.library_name}")
 
         db.commit()
         logger.info(f"SYNC COMPLETE - synced: {synced_libraries}, failed: {failed_syncs}")
@@ -1088,6 +1319,102 @@ async def sync_historical_stats(request: schemas.SyncRequest, db: Session = Depe
         raise HTTPException(status_code=500, detail=f"Sync failed: {str(e)}")
 
 
+def _load_libraries_with_history(db: Session, with_stats_only: bool):
+    """
+    Blocking DB half of get_libraries_with_history.
+    Returns None when there are no stats at all (caller falls back to Bunny).
+    """
+    # ONE ordered scan (served by ix_lhs_lib_year_month) lists the libraries,
+    # brings their configured names along and streams their history, instead
+    # of a DISTINCT query, a full library_configs load and then the history.
+    # Only the columns the response needs are selected and rows arrive in
+    # batches, so no ORM objects are built.
+    lhs = models.LibraryHistoricalStats
+    lc = models.LibraryConfig
+    stmt = select(
+        lhs.library_id, lhs.year, lhs.month, lhs.total_views,
+        lhs.total_watch_time_seconds, lhs.bandwidth_gb, lhs.fetch_date, lhs.library_name,
+        lhs.is_synced, lc.library_name.label("config_name"),
+    ).outerjoin(
+        lc, lc.library_id == lhs.library_id
+    ).order_by(
+        lhs.library_id, lhs.year.desc(), lhs.month.desc()
+    )
+    if with_stats_only:
+        # Full history, but only for libraries with at least one synced month
+        synced = aliased(lhs)
+        stmt = stmt.where(lhs.library_id.in_(select(synced.library_id).where(synced.is_synced == True)))
+    history_rows = db.execute(stmt.execution_options(yield_per=500))
+
+    # (library_id, library_name) pairs as the old DISTINCT returned them —
+    # from synced rows only when with_stats_only — in scan order
+    unique_libraries = {}
+    config_names = {}
+    # library_id → (monthly_data, last_updated, name of the most recent fetch)
+    history_by_library = {}
+    for lib_id, rows in itertools.groupby(history_rows, key=lambda row: row.library_id):
+        monthly_data = []
+        last_updated = None
+        latest_name = None
+        for row in rows:
+            if not with_stats_only or row.is_synced:
+                unique_libraries[(lib_id, row.library_name)] = None
+            # Plain dicts in MonthlyData's shape — a fraction of the size of
+            # model instances when there are years of months per library
+            monthly_data.append({
+                "month": row.month, "year": row.year,
+                "total_views": row.total_views,
+                "total_watch_time_seconds": row.total_watch_time_seconds,
+                "bandwidth_gb": row.bandwidth_gb, "fetch_date": row.fetch_date,
+            })
+            if not last_updated or (row.fetch_date and row.fetch_date > last_updated):
+                last_updated = row.fetch_date
+                if row.library_name:
+                    latest_name = row.library_name
+        config_names[lib_id] = row.config_name
+        history_by_library[lib_id] = (monthly_data, last_updated, latest_name)
+
+    if not unique_libraries and not with_stats_only:
+        return None
+
+    result = []
+    teachers_to_upsert = {}
+
+    for lib_id, lib_name in unique_libraries:
+        preferred_name = config_names.get(lib_id) or lib_name
+        teachers_to_upsert[lib_id] = preferred_name
+
+        monthly_data, last_updated, latest_name = history_by_library.get(lib_id, ([], None, None))
+        latest_name = latest_name or lib_name
+
+        result.append(schemas.LibraryWithHistory.construct(
+            library_id=lib_id,
+            library_name=config_names.get(lib_id) or latest_name or lib_name or f"Library {lib_id}",
+            has_stats=len(monthly_data) > 0,
+            monthly_data=monthly_data, last_updated=last_updated
+        ))
+
+    # One teacher upsert for every listed library; names only change when they differ
+    try:
+        if teachers_to_upsert:
+            teachers_table = models.Teacher.__table__
+            stmt = pg_insert(teachers_table).values([
+                {"bunny_library_id": lib_id, "name": preferred_name or f"Library {lib_id}"}
+                for lib_id, preferred_name in teachers_to_upsert.items()
+            ])
+            db.execute(stmt.on_conflict_do_update(
+                index_elements=["bunny_library_id"],
+                set_={"name": stmt.excluded.name},
+                where=teachers_table.c.name != stmt.excluded.name
+            ))
+        db.commit()
+    except Exception as upsert_err:
+        db.rollback()
+        logger.warning(f"Teacher batch upsert failed (non-fatal): {str(upsert_err)}")
+
+    return result
+
+
 @app.get("/historical-stats/libraries/", response_model=List[schemas.LibraryWithHistory])
 async def get_libraries_with_history(with_stats_only: bool = False, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     try:
@@ -1102,128 +1429,230 @@ async def get_libraries_with_history(with_stats_only: bool = False, db: Session
             and (now - _historical_stats_cache["fetched_at"]).total_seconds() < _historical_stats_cache["ttl_seconds"]
         ):
             age = int((now - _historical_stats_cache["fetched_at"]).total_seconds())
-            logger.info(f"[HistoricalStatsCache] HIT — {len(_historical_stats_cache['data'])} entries, {age}s old")
-            return _historical_stats_cache["data"]
+            logger.info(f"[HistoricalStatsCache] HIT — {_historical_stats_cache['count']} entries, {age}s old")
+            return Response(content=_historical_stats_cache["data"], media_type="application/json")
 
         logger.info(f"[HistoricalStatsCache] MISS — querying database (with_stats_only={with_stats_only})")
 
-        libraries_query = db.query(
-            models.LibraryHistoricalStats.library_id,
-            models.LibraryHistoricalStats.library_name
-        ).distinct()
-
-        if with_stats_only:
-            libraries_query = libraries_query.filter(models.LibraryHistoricalStats.is_synced == True)
-
-        unique_libraries = libraries_query.all()
+        result = await run_in_threadpool(_load_libraries_with_history, db, with_stats_only)
 
-        if not unique_libraries and not with_stats_only:
+        if result is None:
             bunny_libraries = await get_bunny_libraries()
             result = [schemas.LibraryWithHistory(
                 library_id=lib.get("id"), library_name=lib.get("name"),
                 has_stats=False, monthly_data=[], last_updated=None
             ) for lib in bunny_libraries]
-            _historical_stats_cache["data"] = result
-            _historical_stats_cache["fetched_at"] = datetime.now(_pytz.UTC)
-            _historical_stats_cache["cache_key"] = cache_key
-            return result
+        else:
+            logger.info(f"[HistoricalStatsCache] Cached {len(result)} libraries")
+
+        # Rows are built with .construct() from trusted DB values; render them
+        # once and serve the same body on every hit instead of re-validating.
+        # Encoding a few libraries at a time avoids a second full copy of the
+        # history as jsonable_encoder output next to the list itself.
+        body = b"".join(_stream_json_array(result, batch_size=50))
+        _historical_stats_cache["data"] = body
+        _historical_stats_cache["count"] = len(result)
+        _historical_stats_cache["fetched_at"] = datetime.now(_pytz.UTC)
+        _historical_stats_cache["cache_key"] = cache_key
 
-        config_names = {cfg.library_id: cfg.library_name for cfg in db.query(models.LibraryConfig).all()}
+        return Response(content=body, media_type="application/json")
 
-        # Fetch ALL historical stats in ONE query — fixes the 104s N+1 problem
-        all_stats = db.query(models.LibraryHistoricalStats).order_by(
-            models.LibraryHistoricalStats.library_id,
-            models.LibraryHistoricalStats.year.desc(),
-            models.LibraryHistoricalStats.month.desc()
-        ).all()
+    except Exception as e:
+        logger.error(f"Get libraries with history error: {str(e)}")
+        raise HTTPException(status_code=500, detail="An internal server error occurred. Please try again.")
 
-        stats_by_library = {}
-        for stat in all_stats:
-            stats_by_library.setdefault(stat.library_id, []).append(stat)
+# ============================================
+# REFERENCE DATA CACHE (stages / sections / subjects)
+# ============================================
+# Near-static lookup tables read on every page load. Entries are dropped
+# by the write endpoints below, the TTL only bounds staleness from other workers.
+_reference_data_cache = {
+    "entries": {},
+    "ttl_seconds": 300
+}
 
-        result = []
-        teachers_to_upsert = []
-
-        for lib_id, lib_name in unique_libraries:
-            preferred_name = config_names.get(lib_id) or lib_name
-            teachers_to_upsert.append((lib_id, preferred_name))
-
-            monthly_stats = stats_by_library.get(lib_id, [])
-            monthly_data = []
-            last_updated = None
-            latest_name = lib_name
-
-            for stats in monthly_stats:
-                monthly_data.append(schemas.MonthlyData(
-                    month=stats.month, year=stats.year,
-                    total_views=stats.total_views,
-                    total_watch_time_seconds=stats.total_watch_time_seconds,
-                    bandwidth_gb=stats.bandwidth_gb, fetch_date=stats.fetch_date
-                ))
-                if not last_updated or (stats.fetch_date and stats.fetch_date > last_updated):
-                    last_updated = stats.fetch_date
-                    if stats.library_name:
-                        latest_name = stats.library_name
-
-            result.append(schemas.LibraryWithHistory(
-                library_id=lib_id,
-                library_name=config_names.get(lib_id) or latest_name or lib_name or f"Library {lib_id}",
-                has_stats=len(monthly_data) > 0,
-                monthly_data=monthly_data, last_updated=last_updated
-            ))
 
-        # Batch teacher upserts — no more flush inside loop
+def _reference_cache_get(key: str):
+    entry = _reference_data_cache["entries"].get(key)
+    if entry is None:
+        return None
+    fetched_at, data = entry
+    if (datetime.now(pytz.UTC) - fetched_at).total_seconds() >= _reference_data_cache["ttl_seconds"]:
+        _reference_data_cache["entries"].pop(key, None)
+        return None
+    return data
+
+
+def _reference_cache_set(key: str, data):
+    _reference_data_cache["entries"][key] = (datetime.now(pytz.UTC), data)
+    return data
+
+
+def _json_default(obj):
+    """
+    json.dumps fallback producing what jsonable_encoder would for the types our
+    schemas hold. Only non-JSON values reach it, so plain ints/strs/floats are
+    never walked in Python the way jsonable_encoder walks every field.
+    """
+    if isinstance(obj, pydantic.BaseModel):
+        return obj.dict()
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return int(obj) if obj.as_tuple().exponent >= 0 else float(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _dump_json(obj) -> bytes:
+    return json.dumps(
+        obj, default=_json_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _render_json(items) -> bytes:
+    """Encode already-validated schema objects once, as FastAPI's JSONResponse would."""
+    return _dump_json(items)
+
+
+def _stream_json_array(items, batch_size: int = 200):
+    """
+    Encode an iterable of dicts as a JSON array a batch at a time, using the
+    same encoding as JSONResponse, so the whole body is never held at once.
+    """
+    yield b"["
+    sep = b""
+    it = iter(items)
+    while True:
+        batch = list(itertools.islice(it, batch_size))
+        if not batch:
+            break
+        chunk = b",".join(_dump_json(item) for item in batch)
+        yield sep + chunk
+        sep = b","
+    yield b"]"
+
+
+def _invalidate_reference_cache(*prefixes: str):
+    """Drop every cached entry whose key starts with one of the prefixes."""
+    for key in list(_reference_data_cache["entries"]):
+        if key.startswith(prefixes):
+            _reference_data_cache["entries"].pop(key, None)
+
+
+def _parse_period_months(months) -> list:
+    """(month_str, year, month) for every parseable "YYYY-MM" entry, in order."""
+    parsed = []
+    for month_str in months or []:
         try:
-            existing_teachers = {t.bunny_library_id: t for t in db.query(models.Teacher).all()}
-            for lib_id, preferred_name in teachers_to_upsert:
-                teacher = existing_teachers.get(lib_id)
-                if teacher:
-                    if preferred_name and teacher.name != preferred_name:
-                        teacher.name = preferred_name
-                else:
-                    db.add(models.Teacher(name=preferred_name or f"Library {lib_id}", bunny_library_id=lib_id))
-            db.commit()
-        except Exception as upsert_err:
-            db.rollback()
-            logger.warning(f"Teacher batch upsert failed (non-fatal): {str(upsert_err)}")
+            year, month = map(int, month_str.split("-"))
+        except ValueError:
+            continue
+        parsed.append((month_str, year, month))
+    return parsed
 
-        _historical_stats_cache["data"] = result
-        _historical_stats_cache["fetched_at"] = datetime.now(_pytz.UTC)
-        _historical_stats_cache["cache_key"] = cache_key
-        logger.info(f"[HistoricalStatsCache] Cached {len(result)} libraries")
 
-        return result
+def _load_library_watch_time(db: Session, lib_ids, period):
+    """
+    Period watch time per library, aggregated by Postgres in one grouped query.
+
+    Returns ({library_id: total_seconds}, {library_id: {month_str: seconds}}).
+    With explicit period months every listed month is reported (0 when there
+    is no stats row); without them, every month of the period year that has one.
+    """
+    LHS = models.LibraryHistoricalStats
+    lib_ids = list(lib_ids)
+    period_tuples = period.month_tuples
+    if period.months:
+        period_filter = tuple_(LHS.year, LHS.month).in_(list({(yr, mo) for _, yr, mo in period_tuples}))
+    else:
+        period_filter = LHS.year == period.year
+
+    watch_time_map = {lib_id: 0 for lib_id in lib_ids}
+    by_month_map = {}
+    if lib_ids and (period_tuples or not period.months):
+        month_key = func.to_char(func.make_date(LHS.year, LHS.month, 1), "YYYY-MM")
+        for lib_id, lib_total, by_month in db.query(
+            LHS.library_id,
+            func.coalesce(func.sum(LHS.total_watch_time_seconds), 0),
+            func.jsonb_object_agg(month_key, LHS.total_watch_time_seconds, type_=JSONB),
+        ).filter(
+            LHS.library_id.in_(lib_ids),
+            period_filter,
+        ).group_by(LHS.library_id):
+            watch_time_map[lib_id] = lib_total
+            by_month_map[lib_id] = by_month
+
+    if period.months:
+        monthly_map = {
+            lib_id: {
+                month_str: by_month_map.get(lib_id, {}).get(f"{yr}-{mo:02d}", 0)
+                for month_str, yr, mo in period_tuples
+            }
+            for lib_id in lib_ids
+        }
+    else:
+        monthly_map = {lib_id: by_month_map.get(lib_id, {}) for lib_id in lib_ids}
+    return watch_time_map, monthly_map
+
+
+def _get_period_cached(db: Session, period_id: int):
+    """
+    Period row as a detached attribute namespace; None if it does not exist.
+    `month_tuples` holds its months already parsed by _parse_period_months.
+    """
+    key = f"periods:row:{period_id}"
+    row = _reference_cache_get(key)
+    if row is None:
+        period = db.query(FinancialPeriod).filter(FinancialPeriod.id == period_id).first()
+        if period is None:
+            return None
+        row = SimpleNamespace(**_period_to_dict(period))
+        row.month_tuples = _parse_period_months(row.months)
+        row = _reference_cache_set(key, row)
+    return row
+
+
+def _get_stage_cached(db: Session, stage_id: int):
+    """Stage row as a detached attribute namespace; None if it does not exist."""
+    key = f"stages:row:{stage_id}"
+    row = _reference_cache_get(key)
+    if row is None:
+        stage = db.query(Stage).filter(Stage.id == stage_id).first()
+        if stage is None:
+            return None
+        row = _reference_cache_set(key, SimpleNamespace(**_stage_to_dict(stage)))
+    return row
 
-    except Exception as e:
-        logger.error(f"Get libraries with history error: {str(e)}")
-        raise HTTPException(status_code=500, detail="An internal server error occurred. Please try again.")
 
 # ============================================
 # STAGE ENDPOINTS
 # ============================================
 
-@app.get("/stages/")
+@app.get("/stages/", response_model=List[StageSchema])
 def get_stages(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    stages = db.query(Stage).order_by(Stage.display_order).all()
-    return [{"id": s.id, "code": s.code, "name": s.name, "display_order": s.display_order,
-             "created_at": s.created_at.isoformat() if s.created_at else None} for s in stages]
+    # The cache holds the rendered body, so hits skip response_model re-validation too
+    body = _reference_cache_get("stages:v1")
+    if body is None:
+        stages = db.query(Stage).order_by(Stage.display_order).all()
+        body = _reference_cache_set("stages:v1", _render_json([StageSchema.from_orm(s) for s in stages]))
+    return Response(content=body, media_type="application/json")
 
 
-@app.post("/stages/")
+@app.post("/stages/", response_model=StageSchema)
 def create_stage(stage: StageCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     try:
         logger.info(f"Creating stage with data: {stage.dict()}")
         existing = db.query(Stage).filter(Stage.code == stage.code).first()
         if existing:
             raise HTTPException(status_code=400, detail=f"Stage with code {stage.code} already exists")
-        db_stage = Stage(**stage.dict())
-        db.add(db_stage)
+        # INSERT ... RETURNING hands back id/created_at without a follow-up SELECT
+        row = db.execute(insert(Stage).values(**stage.dict()).returning(*Stage.__table__.c)).one()
         db.commit()
-        db.refresh(db_stage)
-        logger.info(f"Stage created successfully: {db_stage.id}")
-        return {"id": db_stage.id, "code": db_stage.code, "name": db_stage.name,
-                "display_order": db_stage.display_order,
-                "created_at": db_stage.created_at.isoformat() if db_stage.created_at else None}
+        _invalidate_reference_cache("stages:")
+        logger.info(f"Stage created successfully: {row.id}")
+        return StageSchema.from_orm(row)
     except HTTPException:
         raise
     except Exception as e:
@@ -1241,6 +1670,7 @@ def update_stage(stage_id: int, stage: StageUpdate, db: Session = Depends(get_db
         setattr(db_stage, field, value)
     db.commit()
     db.refresh(db_stage)
+    _invalidate_reference_cache("stages:")
     return {"id": db_stage.id, "code": db_stage.code, "name": db_stage.name,
             "display_order": db_stage.display_order,
             "created_at": db_stage.created_at.isoformat() if db_stage.created_at else None}
@@ -1253,6 +1683,7 @@ def delete_stage(stage_id: int, db: Session = Depends(get_db), current_user: mod
         raise HTTPException(status_code=404, detail="Stage not found")
     db.delete(db_stage)
     db.commit()
+    _invalidate_reference_cache("stages:", "sections:")
     return {"message": "Stage deleted successfully"}
 
 
@@ -1260,26 +1691,25 @@ def delete_stage(stage_id: int, db: Session = Depends(get_db), current_user: mod
 # SECTION ENDPOINTS
 # ============================================
 
-@app.get("/sections/")
+@app.get("/sections/", response_model=List[SectionSchema])
 def get_sections(stage_id: int = None, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    query = db.query(Section)
-    if stage_id:
-        query = query.filter(Section.stage_id == stage_id)
-    sections = query.all()
-    return [{"id": s.id, "stage_id": s.stage_id, "code": s.code, "name": s.name,
-             "created_at": s.created_at.isoformat() if s.created_at else None} for s in sections]
+    cache_key = f"sections:v1:{stage_id or 'all'}"
+    body = _reference_cache_get(cache_key)
+    if body is None:
+        query = db.query(Section)
+        if stage_id:
+            query = query.filter(Section.stage_id == stage_id)
+        body = _reference_cache_set(cache_key, _render_json([SectionSchema.from_orm(s) for s in query.all()]))
+    return Response(content=body, media_type="application/json")
 
 
-@app.post("/sections/")
+@app.post("/sections/", response_model=SectionSchema)
 def create_section(section: SectionCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     try:
-        db_section = Section(**section.dict())
-        db.add(db_section)
+        row = db.execute(insert(Section).values(**section.dict()).returning(*Section.__table__.c)).one()
         db.commit()
-        db.refresh(db_section)
-        return {"id": db_section.id, "stage_id": db_section.stage_id, "code": db_section.code,
-                "name": db_section.name,
-                "created_at": db_section.created_at.isoformat() if db_section.created_at else None}
+        _invalidate_reference_cache("sections:")
+        return SectionSchema.from_orm(row)
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail="An internal server error occurred. Please try again.")
@@ -1292,6 +1722,7 @@ def delete_section(section_id: int, db: Session = Depends(get_db), current_user:
         raise HTTPException(status_code=404, detail="Section not found")
     db.delete(db_section)
     db.commit()
+    _invalidate_reference_cache("sections:")
     return {"message": "Section deleted successfully"}
 
 
@@ -1299,26 +1730,25 @@ def delete_section(section_id: int, db: Session = Depends(get_db), current_user:
 # SUBJECT ENDPOINTS
 # ============================================
 
-@app.get("/subjects/")
+@app.get("/subjects/", response_model=List[SubjectSchema])
 def get_subjects(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    subjects = db.query(Subject).all()
-    return [{"id": s.id, "code": s.code, "name": s.name, "is_common": s.is_common,
-             "created_at": s.created_at.isoformat() if s.created_at else None} for s in subjects]
+    body = _reference_cache_get("subjects:v1")
+    if body is None:
+        subjects = db.query(Subject).all()
+        body = _reference_cache_set("subjects:v1", _render_json([SubjectSchema.from_orm(s) for s in subjects]))
+    return Response(content=body, media_type="application/json")
 
 
-@app.post("/subjects/")
+@app.post("/subjects/", response_model=SubjectSchema)
 def create_subject(subject: SubjectCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     try:
         existing = db.query(Subject).filter(Subject.code == subject.code).first()
         if existing:
             raise HTTPException(status_code=400, detail=f"Subject with code {subject.code} already exists")
-        db_subject = Subject(**subject.dict())
-        db.add(db_subject)
+        row = db.execute(insert(Subject).values(**subject.dict()).returning(*Subject.__table__.c)).one()
         db.commit()
-        db.refresh(db_subject)
-        return {"id": db_subject.id, "code": db_subject.code, "name": db_subject.name,
-                "is_common": db_subject.is_common,
-                "created_at": db_subject.created_at.isoformat() if db_subject.created_at else None}
+        _invalidate_reference_cache("subjects:")
+        return SubjectSchema.from_orm(row)
     except HTTPException:
         raise
     except Exception as e:
@@ -1345,6 +1775,7 @@ def delete_subject(subject_id: int, db: Session = Depends(get_db), current_user:
         )
     db.delete(db_subject)
     db.commit()
+    _invalidate_reference_cache("subjects:")
     return {"message": "Subject deleted successfully"}
 
 
@@ -1357,6 +1788,7 @@ def update_subject(subject_id: int, subject: SubjectCreate, db: Session = Depend
         existing = db.query(Subject).filter(Subject.code == subject.code.upper().strip()).first()
         if existing:
             raise HTTPException(status_code=400, detail=f"Subject with code {subject.code} already exists")
+    now = datetime.now(timezone.utc)
     is_common_changing = db_subject.is_common != subject.is_common
     old_is_common = db_subject.is_common
     db_subject.code = subject.code.upper().strip()
@@ -1397,7 +1829,7 @@ def update_subject(subject_id: int, subject: SubjectCreate, db: Session = Depend
             # Update kept assignments: set section_id = null
             for a in to_keep:
                 a.section_id = None
-                a.updated_at = datetime.now(pytz.UTC)
+                a.updated_at = now
             assignments_updated = len(to_keep)
 
         else:
@@ -1406,10 +1838,11 @@ def update_subject(subject_id: int, subject: SubjectCreate, db: Session = Depend
             # User must run Auto-Match to recreate per-section assignments
             # Just flag them as updated so user knows to review
             for a in affected:
-                a.updated_at = datetime.now(pytz.UTC)
+                a.updated_at = now
             assignments_updated = len(affected)
     db.commit()
     db.refresh(db_subject)
+    _invalidate_reference_cache("subjects:")
     return {
         "id": db_subject.id,
         "code": db_subject.code,
@@ -1428,241 +1861,249 @@ def update_subject(subject_id: int, subject: SubjectCreate, db: Session = Depend
 
 @app.get("/teacher-assignments/", response_model=List[TeacherAssignmentWithDetails])
 def get_teacher_assignments(stage_id: int = None, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    from sqlalchemy.orm import joinedload
     query = db.query(TeacherAssignment).options(
-        joinedload(TeacherAssignment.stage),
-        joinedload(TeacherAssignment.section),
-        joinedload(TeacherAssignment.subject),
+        selectinload(TeacherAssignment.stage),
+        selectinload(TeacherAssignment.section),
+        selectinload(TeacherAssignment.subject),
     )
     if stage_id:
         query = query.filter(TeacherAssignment.stage_id == stage_id)
-    assignments = query.all()
-    result = []
-    for assignment in assignments:
-        result.append(TeacherAssignmentWithDetails(**{
-            "id": assignment.id,
-            "library_id": assignment.library_id,
-            "library_name": assignment.library_name,
-            "stage_id": assignment.stage_id,
-            "section_id": assignment.section_id,
-            "subject_id": assignment.subject_id,
-            "tax_rate": assignment.tax_rate,
-            "revenue_percentage": assignment.revenue_percentage,
-            "created_at": assignment.created_at,
-            "updated_at": assignment.updated_at,
-            "stage_name": assignment.stage.name if assignment.stage else None,
-            "section_name": assignment.section.name if assignment.section else None,
-            "subject_name": assignment.subject.name if assignment.subject else None,
-            "subject_is_common": assignment.subject.is_common if assignment.subject else None,
-        }))
-    return result
+    # from_orm already validated each row — render directly instead of re-validating
+    return Response(
+        content=_render_json([TeacherAssignmentWithDetails.from_orm(a) for a in query.all()]),
+        media_type="application/json"
+    )
+
+# ============================================
+# LOOKUP PREFETCH
+# ============================================
+
+# Whole-table id -> row caches only read these columns, so skip the rest
+_STAGE_LOOKUP_COLS   = load_only(Stage.id, Stage.code, Stage.name)
+_SECTION_LOOKUP_COLS = load_only(Section.id, Section.stage_id, Section.code, Section.name)
+_SUBJECT_LOOKUP_COLS = load_only(Subject.id, Subject.code, Subject.name, Subject.is_common)
+
+# The financial endpoints load every relationship they touch up front; under
+# SQL_DEBUG any other relationship access on their rows raises instead of
+# lazy-loading, so a reintroduced N+1 fails loudly in development
+_STRICT_LOADING = (raiseload("*"),) if SQL_DEBUG else ()
+
+
+def _bulk_map(db: Session, model, ids, *options) -> dict:
+    """Fetch the rows of `model` with the given ids in one IN query, keyed by id."""
+    ids = list(set(ids))
+    if not ids:
+        return {}
+    return {o.id: o for o in db.query(model).options(*options).filter(model.id.in_(ids)).all()}
 
 # ============================================
 # SERIALIZER HELPERS
 # ============================================
 
+# Each helper reads its columns with one C-level attrgetter call and zips them
+# onto a fixed key tuple instead of loading attributes one by one.
+
+_STAGE_KEYS = ("id", "code", "name", "display_order", "created_at")
+_STAGE_GET = attrgetter(*_STAGE_KEYS)
+
+_SECTION_KEYS = ("id", "stage_id", "code", "name", "created_at")
+_SECTION_GET = attrgetter(*_SECTION_KEYS)
+
+_REVENUE_KEYS = (
+    "id", "period_id", "stage_id", "section_id", "total_orders",
+    "total_revenue_egp", "created_at", "updated_at",
+)
+_REVENUE_GET = attrgetter(*_REVENUE_KEYS)
+
+_ASSIGNMENT_KEYS = (
+    "id", "library_id", "library_name", "stage_id", "section_id", "subject_id",
+    "tax_rate", "revenue_percentage", "created_at", "updated_at",
+)
+_ASSIGNMENT_GET = attrgetter(*_ASSIGNMENT_KEYS)
+
+_PAYMENT_KEYS = (
+    "id", "period_id", "assignment_id", "library_id", "library_name",
+    "stage_id", "section_id", "subject_id", "total_watch_time_seconds",
+    "watch_time_percentage", "section_total_orders", "section_order_percentage",
+    "base_revenue", "revenue_percentage_applied", "calculated_revenue",
+    "tax_rate_applied", "tax_amount", "final_payment", "created_at",
+)
+_PAYMENT_GET = attrgetter(*_PAYMENT_KEYS)
+
+_PERIOD_KEYS = ("id", "name", "year", "notes", "created_at")
+_PERIOD_GET = attrgetter(*_PERIOD_KEYS)
+
+
 def _stage_to_dict(obj) -> dict:
-    return {
-        "id":            obj.id,
-        "code":          obj.code,
-        "name":          obj.name,
-        "display_order": obj.display_order,
-        "created_at":    obj.created_at,
-    }
+    return dict(zip(_STAGE_KEYS, _STAGE_GET(obj)))
 
 
 def _section_to_dict(obj) -> dict:
-    return {
-        "id":         obj.id,
-        "stage_id":   obj.stage_id,
-        "code":       obj.code,
-        "name":       obj.name,
-        "created_at": obj.created_at,
-    }
+    return dict(zip(_SECTION_KEYS, _SECTION_GET(obj)))
 
 
 def _section_revenue_with_details_to_dict(obj, stage_name, section_name) -> dict:
-    return {
-        "id":                obj.id,
-        "period_id":         obj.period_id,
-        "stage_id":          obj.stage_id,
-        "section_id":        obj.section_id,
-        "total_orders":      obj.total_orders,
-        "total_revenue_egp": obj.total_revenue_egp,
-        "created_at":        obj.created_at,
-        "updated_at":        obj.updated_at,
-        "stage_name":        stage_name,
-        "section_name":      section_name,
-    }
+    d = dict(zip(_REVENUE_KEYS, _REVENUE_GET(obj)))
+    d["stage_name"] = stage_name
+    d["section_name"] = section_name
+    return d
 
 
 def _assignment_with_details_to_dict(obj, stage_name, section_name, subject_name, subject_is_common) -> dict:
-    return {
-        "id":                 obj.id,
-        "library_id":         obj.library_id,
-        "library_name":       obj.library_name,
-        "stage_id":           obj.stage_id,
-        "section_id":         obj.section_id,
-        "subject_id":         obj.subject_id,
-        "tax_rate":           obj.tax_rate,
-        "revenue_percentage": obj.revenue_percentage,
-        "created_at":         obj.created_at,
-        "updated_at":         obj.updated_at,
-        "stage_name":         stage_name,
-        "section_name":       section_name,
-        "subject_name":       subject_name,
-        "subject_is_common":  subject_is_common,
-    }
+    d = dict(zip(_ASSIGNMENT_KEYS, _ASSIGNMENT_GET(obj)))
+    d.update(
+        stage_name=stage_name, section_name=section_name,
+        subject_name=subject_name, subject_is_common=subject_is_common,
+    )
+    return d
 
 
 def _payment_with_details_to_dict(obj, stage_name, section_name, subject_name, subject_is_common, teacher_profile_id=None) -> dict:
-    return {
-        "id":                          obj.id,
-        "period_id":                   obj.period_id,
-        "assignment_id":               obj.assignment_id,
-        "library_id":                  obj.library_id,
-        "library_name":                obj.library_name,
-        "stage_id":                    obj.stage_id,
-        "section_id":                  obj.section_id,
-        "subject_id":                  obj.subject_id,
-        "teacher_profile_id":          teacher_profile_id,
-        "total_watch_time_seconds":    obj.total_watch_time_seconds,
-        "watch_time_percentage":       obj.watch_time_percentage,
-        "monthly_watch_breakdown":     obj.monthly_watch_breakdown or {},
-        "section_total_orders":        obj.section_total_orders,
-        "section_order_percentage":    obj.section_order_percentage,
-        "base_revenue":                obj.base_revenue,
-        "revenue_percentage_applied":  obj.revenue_percentage_applied,
-        "calculated_revenue":          obj.calculated_revenue,
-        "tax_rate_applied":            obj.tax_rate_applied,
-        "tax_amount":                  obj.tax_amount,
-        "final_payment":               obj.final_payment,
-        "created_at":                  obj.created_at,
-        "stage_name":                  stage_name,
-        "section_name":                section_name,
-        "subject_name":                subject_name,
-        "subject_is_common":           subject_is_common,
-    }
+    d = dict(zip(_PAYMENT_KEYS, _PAYMENT_GET(obj)))
+    d["teacher_profile_id"] = teacher_profile_id
+    d["monthly_watch_breakdown"] = obj.monthly_watch_breakdown or {}
+    d.update(
+        stage_name=stage_name, section_name=section_name,
+        subject_name=subject_name, subject_is_common=subject_is_common,
+    )
+    return d
 
 
 def _period_to_dict(obj) -> dict:
-    return {
-        "id":         obj.id,
-        "name":       obj.name,
-        "year":       obj.year,
-        "notes":      obj.notes,
-        "months":     obj.months or [],
-        "created_at": obj.created_at,
-    }
+    d = dict(zip(_PERIOD_KEYS, _PERIOD_GET(obj)))
+    d["months"] = obj.months or []
+    return d
 
 
 def _revenue_to_dict(obj) -> dict:
-    return {
-        "id":                obj.id,
-        "period_id":         obj.period_id,
-        "stage_id":          obj.stage_id,
-        "section_id":        obj.section_id,
-        "total_orders":      obj.total_orders,
-        "total_revenue_egp": obj.total_revenue_egp,
-        "created_at":        obj.created_at,
-        "updated_at":        obj.updated_at,
-    }
+    return dict(zip(_REVENUE_KEYS, _REVENUE_GET(obj)))
 
 
 def _assignment_to_dict(obj) -> dict:
-    return {
-        "id":                 obj.id,
-        "library_id":         obj.library_id,
-        "library_name":       obj.library_name,
-        "stage_id":           obj.stage_id,
-        "section_id":         obj.section_id,
-        "subject_id":         obj.subject_id,
-        "tax_rate":           obj.tax_rate,
-        "revenue_percentage": obj.revenue_percentage,
-        "created_at":         obj.created_at,
-        "updated_at":         obj.updated_at,
-    }
+    return dict(zip(_ASSIGNMENT_KEYS, _ASSIGNMENT_GET(obj)))
+
+
+@contextmanager
+def write_tx(db: Session, op_name: str, detail: str):
+    """
+    Shared error handling for write endpoints: roll back and log a failed
+    DB write, then surface it as a 500. HTTPExceptions pass through untouched.
+    """
+    try:
+        yield
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error(f"Error in {op_name}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"{detail}: {str(e)}")
 
 
 @app.post("/teacher-assignments/", response_model=TeacherAssignmentSchema)
 def create_teacher_assignment(assignment: TeacherAssignmentCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    try:
-        q = db.query(TeacherAssignment).filter(
-            TeacherAssignment.library_id == assignment.library_id,
-            TeacherAssignment.stage_id   == assignment.stage_id,
-            TeacherAssignment.subject_id == assignment.subject_id,
-        )
+    with write_tx(db, "create_teacher_assignment", "Failed to create assignment"):
+        # One statement instead of SELECT then INSERT/UPDATE. The DO UPDATE only
+        # fires when a rate actually changes; otherwise the stored row is read back
+        # in the same round-trip, so a no-op save writes nothing.
+        ta = TeacherAssignment.__table__
+        stmt = pg_insert(ta).values(**assignment.dict())
         if assignment.section_id is None:
-            q = q.filter(TeacherAssignment.section_id.is_(None))
+            conflict_cols = ["library_id", "stage_id", "subject_id"]
+            conflict_where = ta.c.section_id.is_(None)
         else:
-            q = q.filter(TeacherAssignment.section_id == assignment.section_id)
-
-        existing = q.first()
-
-        if existing:
-            changed = False
-            if assignment.tax_rate != existing.tax_rate:
-                existing.tax_rate = assignment.tax_rate
-                changed = True
-            if assignment.revenue_percentage != existing.revenue_percentage:
-                existing.revenue_percentage = assignment.revenue_percentage
-                changed = True
-            if changed:
-                existing.updated_at = datetime.now(pytz.UTC)
-                db.commit()
-                db.refresh(existing)
-            return _assignment_to_dict(existing)
-
-        db_assignment = TeacherAssignment(**assignment.dict())
-        db.add(db_assignment)
+            conflict_cols = ["library_id", "stage_id", "section_id", "subject_id"]
+            conflict_where = ta.c.section_id.isnot(None)
+        upserted = stmt.on_conflict_do_update(
+            index_elements=conflict_cols,
+            index_where=conflict_where,
+            set_={
+                "tax_rate": stmt.excluded.tax_rate,
+                "revenue_percentage": stmt.excluded.revenue_percentage,
+                "updated_at": func.now(),
+            },
+            where=or_(
+                ta.c.tax_rate.is_distinct_from(stmt.excluded.tax_rate),
+                ta.c.revenue_percentage.is_distinct_from(stmt.excluded.revenue_percentage),
+            ),
+        ).returning(*ta.c).cte("upserted")
+        unchanged = select(ta).where(
+            ta.c.library_id == assignment.library_id,
+            ta.c.stage_id == assignment.stage_id,
+            ta.c.subject_id == assignment.subject_id,
+            conflict_where if assignment.section_id is None else ta.c.section_id == assignment.section_id,
+            ~select(upserted.c.id).exists(),
+        )
+        row = db.execute(select(upserted).union_all(unchanged)).one()
         db.commit()
-        db.refresh(db_assignment)
-        return _assignment_to_dict(db_assignment)
-
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Error in create_teacher_assignment: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to create assignment: {str(e)}")
+        return _assignment_to_dict(row)
 
 
 @app.put("/teacher-assignments/{assignment_id}", response_model=TeacherAssignmentSchema)
 def update_teacher_assignment(assignment_id: int, assignment: TeacherAssignmentUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    db_obj = db.query(TeacherAssignment).filter(TeacherAssignment.id == assignment_id).first()
-    if not db_obj:
+    # Single UPDATE ... RETURNING — no SELECT before, no refresh after
+    ta = TeacherAssignment.__table__
+    row = db.execute(
+        update(ta).where(ta.c.id == assignment_id).values(
+            **assignment.dict(exclude_unset=True), updated_at=func.now()
+        ).returning(*ta.c)
+    ).one_or_none()
+    if row is None:
         raise HTTPException(status_code=404, detail="Assignment not found")
-    for field, value in assignment.dict(exclude_unset=True).items():
-        setattr(db_obj, field, value)
-    db_obj.updated_at = datetime.now(pytz.UTC)
     db.commit()
-    db.refresh(db_obj)
-    return db_obj
+    return dict(row._mapping)
 
 
 @app.delete("/teacher-assignments/{assignment_id}")
 def delete_teacher_assignment(assignment_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    db_assignment = db.query(TeacherAssignment).filter(TeacherAssignment.id == assignment_id).first()
-    if not db_assignment:
-        raise HTTPException(status_code=404, detail="Assignment not found")
-    db.delete(db_assignment)
+    result = db.execute(delete(TeacherAssignment).where(TeacherAssignment.id == assignment_id))
     db.commit()
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Assignment not found")
     return {"message": "Assignment deleted successfully"}
 
 
+_AUTO_MATCH_MSG_COMMON_NO_SECTIONS = "Common – no sections defined for this stage yet"
+_AUTO_MATCH_MSG_COMMON_PREFIX = "Common subject → assigned to: "
+
+
 @app.post("/teacher-assignments/auto-match", response_model=AutoMatchResponse)
 async def auto_match_teachers(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     try:
-        libraries = await get_bunny_libraries()
+        # Lookup tables as plain rows: only a few columns are read, no ORM state needed.
+        # Every existing (library, stage, section, subject) comes in one narrow query —
+        # replaces a .first() round-trip per library × section.
+        def load_lookups():
+            return (
+                db.execute(select(Stage.id, Stage.code)).all(),
+                db.execute(select(Subject.id, Subject.code, Subject.is_common)).all(),
+                db.execute(select(Section.id, Section.stage_id, Section.code, Section.name)).all(),
+                set(db.query(
+                    TeacherAssignment.library_id, TeacherAssignment.stage_id,
+                    TeacherAssignment.section_id, TeacherAssignment.subject_id,
+                ).all()),
+            )
 
-        stages_by_code   = {s.code: s for s in db.query(Stage).all()}
-        subjects_by_code = {s.code: s for s in db.query(Subject).all()}
-        sections_lookup  = {
-            (sec.stage_id, sec.code): sec
-            for sec in db.query(Section).all()
-        }
+        # The Bunny listing and the DB reads are independent — overlap them
+        libraries, (stage_rows, subject_rows, section_rows, existing_keys) = await asyncio.gather(
+            get_bunny_libraries(), run_in_threadpool(load_lookups)
+        )
+
+        stages_by_code   = {s.code: s for s in stage_rows}
+        subjects_by_code = {s.code: s for s in subject_rows}
+        # Case-insensitive fallback; setdefault keeps the first subject per upper-cased code
+        subjects_by_upper = {}
+        for code, subj in subjects_by_code.items():
+            subjects_by_upper.setdefault(code.upper(), subj)
+        sections_lookup   = {}
         sections_by_stage = {}
-        for (sid, _), sec in sections_lookup.items():
-            sections_by_stage.setdefault(sid, []).append(sec)
+        for sec in section_rows:
+            sections_lookup[(sec.stage_id, sec.code)] = sec
+            sections_by_stage.setdefault(sec.stage_id, []).append(sec)
+        # The common-subject message only depends on the stage — build it once per stage
+        common_message_by_stage = {
+            sid: _AUTO_MATCH_MSG_COMMON_PREFIX + ", ".join(sec.code for sec in secs)
+            for sid, secs in sections_by_stage.items()
+        }
 
+        new_rows      = []  # assignment mappings, inserted in bulk after the loop
         results       = []
         matched_count = 0
         unmatched_count = 0
@@ -1678,7 +2119,7 @@ async def auto_match_teachers(db: Session = Depends(get_db), current_user: model
             stage_code, section_code, subject_code, teacher_code, teacher_name = parse_library_name(lib_name)
 
             if not stage_code or not subject_code:
-                results.append(AutoMatchResult(
+                results.append(dict(
                     library_id=lib_id, library_name=lib_name,
                     stage_code=stage_code, section_code=section_code,
                     subject_code=subject_code, matched=False,
@@ -1689,7 +2130,7 @@ async def auto_match_teachers(db: Session = Depends(get_db), current_user: model
 
             stage = stages_by_code.get(stage_code)
             if not stage:
-                results.append(AutoMatchResult(
+                results.append(dict(
                     library_id=lib_id, library_name=lib_name,
                     stage_code=stage_code, section_code=section_code,
                     subject_code=subject_code, matched=False,
@@ -1698,14 +2139,9 @@ async def auto_match_teachers(db: Session = Depends(get_db), current_user: model
                 unmatched_count += 1
                 continue
 
-            subject = subjects_by_code.get(subject_code)
-            if not subject:
-                for code, subj in subjects_by_code.items():
-                    if code.upper() == subject_code.upper():
-                        subject = subj
-                        break
+            subject = subjects_by_code.get(subject_code) or subjects_by_upper.get(subject_code.upper())
             if not subject:
-                results.append(AutoMatchResult(
+                results.append(dict(
                     library_id=lib_id, library_name=lib_name,
                     stage_code=stage_code, section_code=section_code,
                     subject_code=subject_code, matched=False,
@@ -1718,54 +2154,44 @@ async def auto_match_teachers(db: Session = Depends(get_db), current_user: model
                 stage_sections = sections_by_stage.get(stage.id, [])
 
                 if not stage_sections:
-                    existing = db.query(TeacherAssignment).filter(
-                        TeacherAssignment.library_id == lib_id,
-                        TeacherAssignment.stage_id   == stage.id,
-                        TeacherAssignment.subject_id  == subject.id,
-                        TeacherAssignment.section_id  == None,
-                    ).first()
-                    if not existing:
-                        db.add(TeacherAssignment(
+                    key = (lib_id, stage.id, None, subject.id)
+                    if key not in existing_keys:
+                        existing_keys.add(key)
+                        new_rows.append(dict(
                             library_id=lib_id, library_name=lib_name,
                             stage_id=stage.id, section_id=None,
                             subject_id=subject.id,
                             tax_rate=0.0, revenue_percentage=0.95,
                         ))
-                    results.append(AutoMatchResult(
+                    results.append(dict(
                         library_id=lib_id, library_name=lib_name,
                         stage_code=stage_code, section_code="NONE_YET",
                         subject_code=subject_code, matched=True,
-                        message="Common – no sections defined for this stage yet"
+                        message=_AUTO_MATCH_MSG_COMMON_NO_SECTIONS
                     ))
                 else:
-                    assigned_to = []
                     for sec in stage_sections:
-                        existing = db.query(TeacherAssignment).filter(
-                            TeacherAssignment.library_id == lib_id,
-                            TeacherAssignment.stage_id   == stage.id,
-                            TeacherAssignment.subject_id  == subject.id,
-                            TeacherAssignment.section_id  == sec.id,
-                        ).first()
-                        if not existing:
-                            db.add(TeacherAssignment(
+                        key = (lib_id, stage.id, sec.id, subject.id)
+                        if key not in existing_keys:
+                            existing_keys.add(key)
+                            new_rows.append(dict(
                                 library_id=lib_id, library_name=lib_name,
                                 stage_id=stage.id, section_id=sec.id,
                                 subject_id=subject.id,
                                 tax_rate=0.0, revenue_percentage=0.95,
                             ))
-                        assigned_to.append(sec.code)
-                    results.append(AutoMatchResult(
+                    results.append(dict(
                         library_id=lib_id, library_name=lib_name,
                         stage_code=stage_code, section_code="BOTH",
                         subject_code=subject_code, matched=True,
-                        message=f"Common subject → assigned to: {', '.join(assigned_to)}"
+                        message=common_message_by_stage[stage.id]
                     ))
                 matched_count += 1
 
             else:
                 section = sections_lookup.get((stage.id, section_code))
                 if not section:
-                    results.append(AutoMatchResult(
+                    results.append(dict(
                         library_id=lib_id, library_name=lib_name,
                         stage_code=stage_code, section_code=section_code,
                         subject_code=subject_code, matched=False,
@@ -1777,20 +2203,16 @@ async def auto_match_teachers(db: Session = Depends(get_db), current_user: model
                     unmatched_count += 1
                     continue
 
-                existing = db.query(TeacherAssignment).filter(
-                    TeacherAssignment.library_id == lib_id,
-                    TeacherAssignment.stage_id   == stage.id,
-                    TeacherAssignment.subject_id  == subject.id,
-                    TeacherAssignment.section_id  == section.id,
-                ).first()
-                if not existing:
-                    db.add(TeacherAssignment(
+                key = (lib_id, stage.id, section.id, subject.id)
+                if key not in existing_keys:
+                    existing_keys.add(key)
+                    new_rows.append(dict(
                         library_id=lib_id, library_name=lib_name,
                         stage_id=stage.id, section_id=section.id,
                         subject_id=subject.id,
                         tax_rate=0.0, revenue_percentage=0.95,
                     ))
-                results.append(AutoMatchResult(
+                results.append(dict(
                     library_id=lib_id, library_name=lib_name,
                     stage_code=stage_code, section_code=section_code,
                     subject_code=subject_code, matched=True,
@@ -1798,15 +2220,23 @@ async def auto_match_teachers(db: Session = Depends(get_db), current_user: model
                 ))
                 matched_count += 1
 
+        # Multi-row INSERT ... ON CONFLICT DO NOTHING — the unique assignment indexes
+        # absorb rows another run inserted since the prefetch. 1000 rows per
+        # statement keeps each INSERT well under Postgres' bind-parameter limit.
+        ta = TeacherAssignment.__table__
+        for i in range(0, len(new_rows), 1000):
+            db.execute(pg_insert(ta).values(new_rows[i:i + 1000]).on_conflict_do_nothing())
         db.commit()
         logger.info(f"Auto-match: {matched_count} matched, {unmatched_count} unmatched from {len(libraries)} libraries")
 
-        return AutoMatchResponse(
-            total_libraries=len(libraries),
-            matched=matched_count,
-            unmatched=unmatched_count,
-            results=results,
-        )
+        # results are plain dicts of primitives already in AutoMatchResponse shape —
+        # render them directly instead of validating one model per library
+        return JSONResponse(content={
+            "total_libraries": len(libraries),
+            "matched": matched_count,
+            "unmatched": unmatched_count,
+            "results": results,
+        })
 
     except Exception as e:
         db.rollback()
@@ -2072,7 +2502,7 @@ def get_audit_detail(
         raise HTTPException(status_code=404, detail="Audit not found")
     
     # Load section names for display
-    sections_cache = {s.id: s for s in db.query(Section).all()}
+    sections_cache = {s.id: s for s in db.query(Section).options(_SECTION_LOOKUP_COLS).all()}
     # Build per-section formula steps from inputs_snapshot
     inputs = audit.inputs_snapshot or {}
     outputs = audit.outputs_snapshot or {}
@@ -2260,8 +2690,8 @@ def get_finalization_preview(
             )
 
         # Caches
-        stages_cache  = {s.id: s for s in db.query(Stage).all()}
-        sections_cache = {s.id: s for s in db.query(Section).all()}
+        stages_cache  = {s.id: s for s in db.query(Stage).options(_STAGE_LOOKUP_COLS).all()}
+        sections_cache = {s.id: s for s in db.query(Section).options(_SECTION_LOOKUP_COLS).all()}
         profiles_cache = {p.id: p for p in db.query(TeacherProfileModel).all()}
 
         # Group payments by (teacher_profile_id, stage_id, section_id)
@@ -2457,8 +2887,8 @@ def submit_finalization(
 
         # Build response with names
         profiles_cache = {p.id: p for p in db.query(TeacherProfileModel).all()}
-        stages_cache   = {s.id: s for s in db.query(Stage).all()}
-        sections_cache = {s.id: s for s in db.query(Section).all()}
+        stages_cache   = {s.id: s for s in db.query(Stage).options(_STAGE_LOOKUP_COLS).all()}
+        sections_cache = {s.id: s for s in db.query(Section).options(_SECTION_LOOKUP_COLS).all()}
 
         result = []
         for fin in saved:
@@ -2508,8 +2938,8 @@ def get_finalizations(
         PaymentFinalization.period_id == period_id
     ).all()
     profiles_cache = {p.id: p for p in db.query(TeacherProfileModel).all()}
-    stages_cache   = {s.id: s for s in db.query(Stage).all()}
-    sections_cache = {s.id: s for s in db.query(Section).all()}
+    stages_cache   = {s.id: s for s in db.query(Stage).options(_STAGE_LOOKUP_COLS).all()}
+    sections_cache = {s.id: s for s in db.query(Section).options(_SECTION_LOOKUP_COLS).all()}
 
     result = []
     for fin in fins:
@@ -2548,8 +2978,8 @@ def get_teacher_finalization_history(
     fins = db.query(PaymentFinalization).filter(
         PaymentFinalization.teacher_profile_id == profile_id
     ).order_by(PaymentFinalization.period_id.desc()).all()
-    stages_cache   = {s.id: s for s in db.query(Stage).all()}
-    sections_cache = {s.id: s for s in db.query(Section).all()}
+    stages_cache   = {s.id: s for s in db.query(Stage).options(_STAGE_LOOKUP_COLS).all()}
+    sections_cache = {s.id: s for s in db.query(Section).options(_SECTION_LOOKUP_COLS).all()}
     profile = db.query(TeacherProfileModel).filter(TeacherProfileModel.id == profile_id).first()
 
     result = []
@@ -2611,9 +3041,9 @@ def generate_report(
         # Build lookup caches
         profiles_cache  = {p.id: p for p in db.query(TeacherProfileModel).all()}
         periods_cache   = {p.id: p for p in db.query(FinancialPeriod).all()}
-        stages_cache    = {s.id: s for s in db.query(Stage).all()}
-        sections_cache  = {s.id: s for s in db.query(Section).all()}
-        subjects_cache  = {s.id: s for s in db.query(Subject).all()}
+        stages_cache    = {s.id: s for s in db.query(Stage).options(_STAGE_LOOKUP_COLS).all()}
+        sections_cache  = {s.id: s for s in db.query(Section).options(_SECTION_LOOKUP_COLS).all()}
+        subjects_cache  = {s.id: s for s in db.query(Subject).options(_SUBJECT_LOOKUP_COLS).all()}
         assignments_map = {a.id: a for a in db.query(TeacherAssignment).all()}
 
         # Finalization data
@@ -2945,10 +3375,10 @@ def get_dashboard_comparison(
 
         payments = pay_query.all()
 
-        stages_cache   = {s.id: s for s in db.query(Stage).all()}
-        sections_cache = {s.id: s for s in db.query(Section).all()}
+        stages_cache   = {s.id: s for s in db.query(Stage).options(_STAGE_LOOKUP_COLS).all()}
+        sections_cache = {s.id: s for s in db.query(Section).options(_SECTION_LOOKUP_COLS).all()}
         periods_cache  = {p.id: p for p in db.query(FinancialPeriod).all()}
-        subjects_cache = {s.id: s for s in db.query(Subject).all()}
+        subjects_cache = {s.id: s for s in db.query(Subject).options(_SUBJECT_LOOKUP_COLS).all()}
         profiles_cache = {p.id: p for p in db.query(TeacherProfileModel).all()}
         assignments_map = {a.id: a for a in db.query(TeacherAssignment).all()}
 
@@ -3029,15 +3459,19 @@ def get_dashboard_comparison(
 
 @app.get("/financial-periods/", response_model=List[FinancialPeriodSchema])
 def get_financial_periods(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    periods = db.query(FinancialPeriod).order_by(
-        FinancialPeriod.year.desc(), FinancialPeriod.created_at.desc()
-    ).all()
-    return [_period_to_dict(p) for p in periods]
+    # Column mappings are already the response shape — only months needs its default
+    periods = db.execute(
+        select(
+            FinancialPeriod.id, FinancialPeriod.name, FinancialPeriod.year,
+            FinancialPeriod.notes, FinancialPeriod.months, FinancialPeriod.created_at,
+        ).order_by(FinancialPeriod.year.desc(), FinancialPeriod.created_at.desc())
+    ).mappings().all()
+    return [{**p, "months": p["months"] or []} for p in periods]
 
 
 @app.post("/financial-periods/", response_model=FinancialPeriodSchema)
 def create_financial_period(period: FinancialPeriodCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    try:
+    with write_tx(db, "create_financial_period", "Failed to create period"):
         existing = db.query(FinancialPeriod).filter(
             FinancialPeriod.name == period.name
         ).first()
@@ -3051,38 +3485,37 @@ def create_financial_period(period: FinancialPeriodCreate, db: Session = Depends
         db.refresh(db_period)
         return _period_to_dict(db_period)
 
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Error in create_financial_period: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to create period: {str(e)}")
-
 
 @app.put("/financial-periods/{period_id}", response_model=FinancialPeriodSchema)
 def update_financial_period(period_id: int, period: FinancialPeriodUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    try:
-        db_period = db.query(FinancialPeriod).filter(FinancialPeriod.id == period_id).first()
-        if not db_period:
+    with write_tx(db, "update_financial_period", "Failed to update period"):
+        fp = FinancialPeriod.__table__
+        data = period.dict(exclude_unset=True)
+        if data:
+            row = db.execute(
+                update(fp).where(fp.c.id == period_id).values(**data).returning(*fp.c)
+            ).one_or_none()
+        else:
+            row = db.execute(select(fp).where(fp.c.id == period_id)).one_or_none()
+        if row is None:
             raise HTTPException(status_code=404, detail="Period not found")
-        for field, value in period.dict(exclude_unset=True).items():
-            setattr(db_period, field, value)
         db.commit()
-        db.refresh(db_period)
-        return _period_to_dict(db_period)
-    except HTTPException:
-        raise
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Error in update_financial_period: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to update period: {str(e)}")
+        _invalidate_reference_cache(f"periods:row:{period_id}")
+        return _period_to_dict(row)
 
 
 @app.delete("/financial-periods/{period_id}")
 def delete_financial_period(period_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    db_period = db.query(FinancialPeriod).filter(FinancialPeriod.id == period_id).first()
-    if not db_period:
+    # Core DELETE skips the ORM cascade, so clear the delete-orphan children
+    # (section_revenues, teacher_payments) in the same transaction first
+    db.execute(delete(SectionRevenue).where(SectionRevenue.period_id == period_id))
+    db.execute(delete(TeacherPayment).where(TeacherPayment.period_id == period_id))
+    result = db.execute(delete(FinancialPeriod).where(FinancialPeriod.id == period_id))
+    if result.rowcount == 0:
+        db.rollback()
         raise HTTPException(status_code=404, detail="Period not found")
-    db.delete(db_period)
     db.commit()
+    _invalidate_reference_cache(f"periods:row:{period_id}")
     return {"message": "Period deleted successfully"}
 
 
@@ -3092,31 +3525,20 @@ def delete_financial_period(period_id: int, db: Session = Depends(get_db), curre
 
 @app.post("/section-revenues/", response_model=SectionRevenueSchema)
 def create_or_update_section_revenue(revenue: SectionRevenueCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    try:
-        existing = db.query(SectionRevenue).filter(
-            SectionRevenue.period_id  == revenue.period_id,
-            SectionRevenue.stage_id   == revenue.stage_id,
-            SectionRevenue.section_id == revenue.section_id,
-        ).first()
-
-        if existing:
-            existing.total_orders      = revenue.total_orders
-            existing.total_revenue_egp = revenue.total_revenue_egp
-            existing.updated_at        = datetime.now(pytz.UTC)
-            db.commit()
-            db.refresh(existing)
-            return _revenue_to_dict(existing)
-
-        db_revenue = SectionRevenue(**revenue.dict())
-        db.add(db_revenue)
+    with write_tx(db, "create_or_update_section_revenue", "Failed to save revenue"):
+        sr = SectionRevenue.__table__
+        stmt = pg_insert(sr).values(**revenue.dict())
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["period_id", "stage_id", "section_id"],
+            set_={
+                "total_orders": stmt.excluded.total_orders,
+                "total_revenue_egp": stmt.excluded.total_revenue_egp,
+                "updated_at": func.now(),
+            },
+        ).returning(*sr.c)
+        row = db.execute(stmt).one()
         db.commit()
-        db.refresh(db_revenue)
-        return _revenue_to_dict(db_revenue)
-
-    except Exception as e:
-        db.rollback()
-        logger.error(f"Error in create_or_update_section_revenue: {e}")
-        raise HTTPException(status_code=500, detail=f"Failed to save revenue: {str(e)}")
+        return _revenue_to_dict(row)
 
 
 # ============================================
@@ -3126,18 +3548,23 @@ def create_or_update_section_revenue(revenue: SectionRevenueCreate, db: Session
 @app.get("/financials/{period_id}/{stage_id}", response_model=FinancialData)
 def get_financial_data(period_id: int, stage_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     try:
-        period = db.query(FinancialPeriod).filter(FinancialPeriod.id == period_id).first()
+        period = _get_period_cached(db, period_id)
         if not period:
             raise HTTPException(status_code=404, detail="Period not found")
 
-        stage = db.query(Stage).filter(Stage.id == stage_id).first()
+        stage = _get_stage_cached(db, stage_id)
         if not stage:
             raise HTTPException(status_code=404, detail="Stage not found")
 
-        sections = db.query(Section).filter(Section.stage_id == stage_id).all()
-        section_map = {s.id: s for s in sections}
+        # Each section is read off the ORM row once; the response list and the
+        # name lookups below share the same dicts
+        section_dicts = [
+            _section_to_dict(s)
+            for s in db.query(Section).options(*_STRICT_LOADING).filter(Section.stage_id == stage_id)
+        ]
+        section_names = {d["id"]: d["name"] for d in section_dicts}
 
-        section_revenues_raw = db.query(SectionRevenue).filter(
+        section_revenues_raw = db.query(SectionRevenue).options(*_STRICT_LOADING).filter(
             SectionRevenue.period_id == period_id,
             SectionRevenue.stage_id  == stage_id,
         ).all()
@@ -3145,59 +3572,59 @@ def get_financial_data(period_id: int, stage_id: int, db: Session = Depends(get_
             _section_revenue_with_details_to_dict(
                 rev,
                 stage_name=stage.name,
-                section_name=section_map[rev.section_id].name if rev.section_id in section_map else None,
+                section_name=section_names.get(rev.section_id),
             )
             for rev in section_revenues_raw
         ]
 
-        assignments_raw = db.query(TeacherAssignment).filter(
+        assignments_raw = db.query(TeacherAssignment).options(*_STRICT_LOADING).filter(
             TeacherAssignment.stage_id == stage_id
         ).all()
         assignment_map = {a.id: a for a in assignments_raw}
-        subject_cache = {}
-        def get_subject(subject_id):
-            if subject_id not in subject_cache:
-                subject_cache[subject_id] = db.query(Subject).filter(Subject.id == subject_id).first()
-            return subject_cache[subject_id]
+        payments_raw = db.query(TeacherPayment).options(*_STRICT_LOADING).filter(
+            TeacherPayment.period_id == period_id,
+            TeacherPayment.stage_id  == stage_id,
+        ).all()
+        subjects = _bulk_map(
+            db, Subject,
+            itertools.chain((a.subject_id for a in assignments_raw), (p.subject_id for p in payments_raw)),
+            _SUBJECT_LOOKUP_COLS,
+        )
 
         assignments_dicts = []
         for a in assignments_raw:
-            sec = section_map.get(a.section_id) if a.section_id else None
-            subj = get_subject(a.subject_id)
+            subj = subjects.get(a.subject_id)
             assignments_dicts.append(_assignment_with_details_to_dict(
                 a,
                 stage_name=stage.name,
-                section_name=sec.name if sec else None,
+                section_name=section_names.get(a.section_id),
                 subject_name=subj.name if subj else None,
                 subject_is_common=subj.is_common if subj else None,
             ))
 
-        payments_raw = db.query(TeacherPayment).filter(
-            TeacherPayment.period_id == period_id,
-            TeacherPayment.stage_id  == stage_id,
-        ).all()
         payments_dicts = []
         for p in payments_raw:
-            sec = section_map.get(p.section_id) if p.section_id else None
-            subj = get_subject(p.subject_id)
+            subj = subjects.get(p.subject_id)
             assignment = assignment_map.get(p.assignment_id)           # ← ADD
             tp_id = assignment.teacher_profile_id if assignment else None
             payments_dicts.append(_payment_with_details_to_dict(
                 p,
                 stage_name=stage.name,
-                section_name=sec.name if sec else None,
+                section_name=section_names.get(p.section_id),
                 subject_name=subj.name if subj else None,
                 subject_is_common=subj.is_common if subj else None,
                 teacher_profile_id=tp_id,
             ))
 
+        # Hand the plain row dicts to FinancialData and let it validate each one once;
+        # wrapping them in their *WithDetails models first validated every row twice
         return FinancialData(
             period=_period_to_dict(period),
             stage=_stage_to_dict(stage),
-            sections=[_section_to_dict(s) for s in sections],
-            section_revenues=[SectionRevenueWithDetails(**d) for d in section_revenues_dicts],
-            teacher_assignments=[TeacherAssignmentWithDetails(**d) for d in assignments_dicts],
-            teacher_payments=[TeacherPaymentWithDetails(**d) for d in payments_dicts],
+            sections=section_dicts,
+            section_revenues=section_revenues_dicts,
+            teacher_assignments=assignments_dicts,
+            teacher_payments=payments_dicts,
         )
 
     except HTTPException:
@@ -3215,27 +3642,22 @@ def get_libraries_preview(period_id: int, stage_id: int, db: Session = Depends(g
     broken down per period month. Libraries with zero analytics are flagged.
     """
     try:
-        period = db.query(FinancialPeriod).filter(FinancialPeriod.id == period_id).first()
+        period = _get_period_cached(db, period_id)
         if not period:
             raise HTTPException(status_code=404, detail="Period not found")
 
         period_months = period.months or []
 
-        assignments = db.query(TeacherAssignment).filter(
+        assignments = db.query(TeacherAssignment).options(*_STRICT_LOADING).filter(
             TeacherAssignment.stage_id == stage_id
         ).all()
 
-        subject_cache = {}
-        def get_subject(subject_id):
-            if subject_id not in subject_cache:
-                subject_cache[subject_id] = db.query(Subject).filter(Subject.id == subject_id).first()
-            return subject_cache[subject_id]
+        subjects = _bulk_map(db, Subject, (a.subject_id for a in assignments), _SUBJECT_LOOKUP_COLS)
+        sections = _bulk_map(db, Section, (a.section_id for a in assignments if a.section_id), _SECTION_LOOKUP_COLS)
 
-        section_cache = {}
-        def get_section(section_id):
-            if section_id not in section_cache:
-                section_cache[section_id] = db.query(Section).filter(Section.id == section_id).first()
-            return section_cache[section_id]
+        watch_time_map, monthly_map = _load_library_watch_time(
+            db, {a.library_id for a in assignments}, period,
+        )
 
         libraries = []
         seen = set()
@@ -3246,25 +3668,10 @@ def get_libraries_preview(period_id: int, stage_id: int, db: Session = Depends(g
                 continue
             seen.add(key)
 
-            subj = get_subject(a.subject_id)
-            sec  = get_section(a.section_id) if a.section_id else None
+            subj = subjects.get(a.subject_id)
+            sec  = sections.get(a.section_id) if a.section_id else None
 
-            monthly_breakdown = {}
-            total_seconds = 0
-
-            for month_str in period_months:
-                try:
-                    year, month = map(int, month_str.split("-"))
-                except ValueError:
-                    continue
-                stat = db.query(models.LibraryHistoricalStats).filter(
-                    models.LibraryHistoricalStats.library_id == a.library_id,
-                    models.LibraryHistoricalStats.year  == year,
-                    models.LibraryHistoricalStats.month == month,
-                ).first()
-                secs = stat.total_watch_time_seconds if stat else 0
-                monthly_breakdown[month_str] = secs
-                total_seconds += secs
+            total_seconds = watch_time_map[a.library_id]
 
             libraries.append({
                 "library_id":               a.library_id,
@@ -3273,7 +3680,7 @@ def get_libraries_preview(period_id: int, stage_id: int, db: Session = Depends(g
                 "subject_is_common":        subj.is_common if subj else False,
                 "section_name":             sec.name if sec else "All Sections",
                 "total_watch_time_seconds": total_seconds,
-                "monthly_watch_breakdown":  monthly_breakdown,
+                "monthly_watch_breakdown":  monthly_map[a.library_id],
                 "has_analytics":            total_seconds > 0,
             })
 
@@ -3321,11 +3728,11 @@ async def calculate_payments(
         if request and isinstance(request, dict):
             excluded_ids = request.get("excluded_library_ids", [])
 
-        period = db.query(FinancialPeriod).filter(FinancialPeriod.id == period_id).first()
+        period = _get_period_cached(db, period_id)
         if not period:
             raise HTTPException(status_code=404, detail="Period not found")
 
-        stage = db.query(Stage).filter(Stage.id == stage_id).first()
+        stage = _get_stage_cached(db, stage_id)
         if not stage:
             raise HTTPException(status_code=404, detail="Stage not found")
 
@@ -3342,14 +3749,14 @@ async def calculate_payments(
                 detail="This stage has already been finalized. Use 'Reset Stage' to unlock recalculation."
             )
 
-        section_revenues = db.query(SectionRevenue).filter(
+        section_revenues = db.query(SectionRevenue).options(*_STRICT_LOADING).filter(
             SectionRevenue.period_id == period_id,
             SectionRevenue.stage_id  == stage_id,
         ).all()
         if not section_revenues:
             raise HTTPException(status_code=400, detail="No revenue data found. Please add revenue data first.")
 
-        assignments = db.query(TeacherAssignment).filter(
+        assignments = db.query(TeacherAssignment).options(*_STRICT_LOADING).filter(
             TeacherAssignment.stage_id == stage_id
         ).all()
         if excluded_ids:
@@ -3357,58 +3764,17 @@ async def calculate_payments(
         if not assignments:
             raise HTTPException(status_code=400, detail="No teacher assignments found after exclusions.")
 
-        # Delete old payments for this period+stage
-        db.query(TeacherPayment).filter(
-            TeacherPayment.period_id == period_id,
-            TeacherPayment.stage_id  == stage_id,
-        ).delete()
-
         # ── Build raw watch-time map + monthly breakdown ──────────────────────
-        watch_time_map = {}  # library_id → total seconds for period months
-        monthly_map    = {}  # library_id → {month_str: seconds}
-
-        for a in assignments:
-            lib_id = a.library_id
-            if lib_id in watch_time_map:
-                continue
-
-            breakdown = {}
-            total = 0
-
-            if period_months:
-                for month_str in period_months:
-                    try:
-                        yr, mo = map(int, month_str.split("-"))
-                    except ValueError:
-                        continue
-                    stat = db.query(models.LibraryHistoricalStats).filter(
-                        models.LibraryHistoricalStats.library_id == lib_id,
-                        models.LibraryHistoricalStats.year  == yr,
-                        models.LibraryHistoricalStats.month == mo,
-                    ).first()
-                    secs = stat.total_watch_time_seconds if stat else 0
-                    breakdown[month_str] = secs
-                    total += secs
-            else:
-                # Fallback: all stats for the period year
-                stats = db.query(models.LibraryHistoricalStats).filter(
-                    models.LibraryHistoricalStats.library_id == lib_id,
-                    models.LibraryHistoricalStats.year       == period.year,
-                ).all()
-                for stat in stats:
-                    key  = f"{stat.year}-{stat.month:02d}"
-                    breakdown[key] = stat.total_watch_time_seconds
-                    total += stat.total_watch_time_seconds
-
-            watch_time_map[lib_id] = total
-            monthly_map[lib_id]    = breakdown
+        # watch_time_map: library_id → total seconds for period months
+        # monthly_map:    library_id → {month_str: seconds}
+        watch_time_map, monthly_map = _load_library_watch_time(
+            db, dict.fromkeys(a.library_id for a in assignments), period,
+        )
 
         # ── Caches ───────────────────────────────────────────────────────────
-        subject_cache = {}
-        def get_subject(sid):
-            if sid not in subject_cache:
-                subject_cache[sid] = db.query(Subject).filter(Subject.id == sid).first()
-            return subject_cache[sid]
+        subjects = _bulk_map(db, Subject, (a.subject_id for a in assignments), _SUBJECT_LOOKUP_COLS)
+        # Resolved once per assignment; a missing subject counts as not common
+        is_common = {a.id: bool(subjects.get(a.subject_id) and subjects[a.subject_id].is_common) for a in assignments}
 
         section_map = {s.id: s for s in db.query(Section).filter(Section.stage_id == stage_id).all()}
 
@@ -3420,8 +3786,8 @@ async def calculate_payments(
         broken_assignments = [
             a for a in assignments
             if a.section_id is None
-            and get_subject(a.subject_id)
-            and not get_subject(a.subject_id).is_common
+            and a.subject_id in subjects
+            and not is_common[a.id]
         ]
         if broken_assignments:
             broken_names = ', '.join(f"'{a.library_name}'" for a in broken_assignments[:5])
@@ -3439,54 +3805,56 @@ async def calculate_payments(
         # null section_id   → already blocked above
         allocated_wt = {rev.section_id: {} for rev in section_revenues}
 
-        # Build per-library subset order totals for section-specific subjects
-        # that appear in only a subset of sections
-        # Key: (library_id, subject_id) → set of section_ids assigned
+        # One pass groups assignments by section and, for section-specific
+        # subjects that appear in only a subset of sections, collects
+        # (library_id, subject_id) → set of section_ids assigned
+        assignments_by_section = {}
         lib_subject_sections = {}
         for a in assignments:
-            subj = get_subject(a.subject_id)
-            if subj and not subj.is_common and a.section_id is not None:
+            assignments_by_section.setdefault(a.section_id, []).append(a)
+            if a.subject_id in subjects and not is_common[a.id] and a.section_id is not None:
                 k = (a.library_id, a.subject_id)
                 lib_subject_sections.setdefault(k, set()).add(a.section_id)
 
+        # Allocation and STEP 2's section pools (pool = Σ allocated_wt for the
+        # section) are accumulated in the same pass
+        section_pool = {sec_id: 0 for sec_id in allocated_wt}
+        subset_orders_by_key = {}
         for a in assignments:
-            subj = get_subject(a.subject_id)
-            if not subj:
+            if a.subject_id not in subjects:
                 continue
             if a.section_id not in allocated_wt:
                 continue
 
             raw_wt = watch_time_map.get(a.library_id, 0)
+            k = (a.library_id, a.subject_id)
 
-            if subj.is_common:
+            if is_common[a.id]:
                 # Common → use total_all_orders as denominator
                 ratio = orders_by_section.get(a.section_id, 0) / total_all_orders
             else:
                 # Section-specific subset → denominator is sum of ONLY assigned sections
-                k = (a.library_id, a.subject_id)
-                assigned_secs = lib_subject_sections.get(k, {a.section_id})
-                subset_orders = sum(orders_by_section.get(s, 0) for s in assigned_secs)
+                subset_orders = subset_orders_by_key.get(k)
+                if subset_orders is None:
+                    assigned_secs = lib_subject_sections.get(k, {a.section_id})
+                    subset_orders = sum(orders_by_section.get(s, 0) for s in assigned_secs)
+                    subset_orders_by_key[k] = subset_orders
                 ratio = orders_by_section.get(a.section_id, 0) / subset_orders if subset_orders > 0 else 0.0
 
             alloc = raw_wt * ratio
-            key = (a.library_id, a.subject_id)
-            allocated_wt[a.section_id][key] = alloc
+            allocated_wt[a.section_id][k] = alloc
+            section_pool[a.section_id] += alloc
             logger.info(
-                f"{'Common' if subj.is_common else 'Subset'} lib {a.library_id} "
+                f"{'Common' if is_common[a.id] else 'Subset'} lib {a.library_id} "
                 f"→ sec {a.section_id}: {alloc:.0f}s (ratio={ratio:.3f})"
             )
 
-        # ── STEP 2: Build section watch-time pools ────────────────────────────
-        # pool = Σ allocated_wt (all assignments for this section)
-        section_pool = {}
-        for rev in section_revenues:
-            sec_id = rev.section_id
-            sec_total = sum(allocated_wt[sec_id].values())
-            section_pool[sec_id] = sec_total
+        # ── STEP 2: Section watch-time pools (summed above) ───────────────────
+        for sec_id, sec_total in section_pool.items():
             logger.info(f"Section {sec_id} pool: {sec_total:.0f}s")
 
         # ── STEP 3: Create payment records ────────────────────────────────────
-        payments_created  = []
+        payment_rows      = []
         total_payment_sum = 0.0
 
         for rev in section_revenues:
@@ -3496,11 +3864,8 @@ async def calculate_payments(
             pool        = section_pool.get(sec_id, 0)
             ord_frac    = orders_by_section[sec_id] / total_all_orders
 
-            for a in assignments:
-                if a.section_id != sec_id:
-                    continue
-
-                subj = get_subject(a.subject_id)
+            for a in assignments_by_section.get(sec_id, ()):
+                subj = subjects.get(a.subject_id)
                 key = (a.library_id, a.subject_id)
                 teacher_wt = allocated_wt[sec_id].get(key, 0)
                 wt_pct     = (teacher_wt / pool) if pool > 0 else 0.0
@@ -3510,7 +3875,7 @@ async def calculate_payments(
                 tax_amt  = calc_rev * a.tax_rate
                 final    = calc_rev - tax_amt
 
-                payment = TeacherPayment(
+                payment_rows.append(dict(
                     period_id=period_id, assignment_id=a.id,
                     library_id=a.library_id, library_name=a.library_name,
                     stage_id=stage_id, section_id=sec_id, subject_id=a.subject_id,
@@ -3525,12 +3890,30 @@ async def calculate_payments(
                     tax_rate_applied=a.tax_rate,
                     tax_amount=tax_amt,
                     final_payment=final,
-                )
-                db.add(payment)
-                payments_created.append(payment)
+                ))
                 total_payment_sum += final
 
-        db.commit()
+        # Upsert on (period_id, assignment_id) rather than deleting the whole
+        # period+stage and inserting it again; only payments this run no longer
+        # produces are deleted. RETURNING hands back the stored rows (with ids)
+        # that the audit and response need.
+        tp = TeacherPayment.__table__
+        db.execute(delete(tp).where(
+            tp.c.period_id == period_id,
+            tp.c.stage_id  == stage_id,
+            tp.c.assignment_id.notin_([r["assignment_id"] for r in payment_rows]),
+        ))
+        payments_created = []
+        for i in range(0, len(payment_rows), 1000):
+            stmt = pg_insert(tp).values(payment_rows[i:i + 1000])
+            stmt = stmt.on_conflict_do_update(
+                index_elements=["period_id", "assignment_id"],
+                set_={
+                    c.name: stmt.excluded[c.name]
+                    for c in tp.c if c.name not in ("id", "period_id", "assignment_id")
+                },
+            ).returning(*tp.c)
+            payments_created.extend(db.execute(stmt).all())
 
         # ── AUDIT GENERATION ─────────────────────────────────────────────────
         # Build warning list
@@ -3538,7 +3921,7 @@ async def calculate_payments(
 
         # Warning: section-specific subjects with no section assigned
         for a in assignments:
-            subj = get_subject(a.subject_id)
+            subj = subjects.get(a.subject_id)
             if subj and not subj.is_common and a.section_id is None:
                 audit_warnings.append({
                     "code": "MISSING_SECTION_ASSIGNMENT",
@@ -3554,8 +3937,8 @@ async def calculate_payments(
 
         # Info: common subjects with null section_id (correctly handled as all-sections)
         for a in assignments:
-            subj = get_subject(a.subject_id)
-            if subj and subj.is_common and a.section_id is None:
+            subj = subjects.get(a.subject_id)
+            if is_common[a.id] and a.section_id is None:
                 audit_warnings.append({
                     "code": "COMMON_SUBJECT_NULL_SECTION",
                     "message": (
@@ -3570,8 +3953,8 @@ async def calculate_payments(
 
         # Info: common subjects with null section_id (correctly handled as all-sections)
         for a in assignments:
-            subj = get_subject(a.subject_id)
-            if subj and subj.is_common and a.section_id is None:
+            subj = subjects.get(a.subject_id)
+            if is_common[a.id] and a.section_id is None:
                 audit_warnings.append({
                     "code": "COMMON_SUBJECT_NULL_SECTION",
                     "message": (
@@ -3609,14 +3992,8 @@ async def calculate_payments(
                 unique_sections = list({a.section_id for a in lib_assignments if a.section_id})
 
                 # Check if ANY assignment for this library is a common subject
-                any_common = any(
-                    get_subject(a.subject_id) and get_subject(a.subject_id).is_common
-                    for a in lib_assignments
-                )
-                all_common = all(
-                    get_subject(a.subject_id) and get_subject(a.subject_id).is_common
-                    for a in lib_assignments
-                )
+                any_common = any(is_common[a.id] for a in lib_assignments)
+                all_common = all(is_common[a.id] for a in lib_assignments)
 
                 if any_common and len(unique_sections) > 1:
                     # Expected: common subject split across multiple sections
@@ -3625,7 +4002,7 @@ async def calculate_payments(
                         sec = section_map.get(sec_id)
                         if sec:
                             section_names.append(sec.name)
-                    subj = get_subject(lib_assignments[0].subject_id)
+                    subj = subjects.get(lib_assignments[0].subject_id)
                     audit_warnings.append({
                         "code": "COMMON_SUBJECT_MULTI_SECTION",
                         "message": (
@@ -3651,9 +4028,11 @@ async def calculate_payments(
                     })
 
         # Warning: sum of payments exceeds section revenue
+        payment_sum_by_section = {}
+        for p in payments_created:
+            payment_sum_by_section[p.section_id] = payment_sum_by_section.get(p.section_id, 0) + p.final_payment
         for rev in section_revenues:
-            sec_payments = [p for p in payments_created if p.section_id == rev.section_id]
-            sec_payment_sum = sum(p.final_payment for p in sec_payments)
+            sec_payment_sum = payment_sum_by_section.get(rev.section_id, 0)
             if sec_payment_sum > rev.total_revenue_egp * 1.01:  # 1% tolerance
                 audit_warnings.append({
                     "code": "PAYMENT_SUM_EXCEEDS_REVENUE",
@@ -3738,10 +4117,8 @@ async def calculate_payments(
                 sec_id = rev.section_id
                 pool = section_pool.get(sec_id, 0)
                 ord_frac = orders_by_section[sec_id] / total_all_orders
-                for a in assignments:
-                    if a.section_id != sec_id:
-                        continue
-                    subj = get_subject(a.subject_id)
+                for a in assignments_by_section.get(sec_id, ()):
+                    subj = subjects.get(a.subject_id)
                     if subj and not subj.is_common and a.section_id is None:
                         continue
                     key = (a.library_id, a.subject_id)
@@ -3815,44 +4192,51 @@ async def calculate_payments(
             acknowledged=False,
         )
         db.add(audit_record)
-        db.commit()
-        db.refresh(audit_record)
-        logger.info(
-            f"Audit saved: id={audit_record.id}, status={audit_status}, "
-            f"warnings={len(audit_warnings)}, verification={verification_status}"
-        )
-
-        # Serialize for response
+        # Payments and audit commit together. Everything below reads
+        # attributes already loaded this request, so nothing is serialized
+        # after the commit expires the session's objects.
+        db.flush()
+        audit_id = audit_record.id
+
+        # Serialize for response — straight from the RETURNING rows and the
+        # lookups already built for this request
         payments_with_details = []
-        
+        profile_by_assignment = {a.id: a.teacher_profile_id for a in assignments}
+
         for payment in payments_created:
-            db.refresh(payment)
             sec  = section_map.get(payment.section_id)
-            subj = get_subject(payment.subject_id)
-            assignment = next((a for a in assignments if a.id == payment.assignment_id), None)
-            tp_id = assignment.teacher_profile_id if assignment else None
-            payments_with_details.append(TeacherPaymentWithDetails(
-                **_payment_with_details_to_dict(
-                    payment,
-                    stage_name=stage.name,
-                    section_name=sec.name if sec else None,
-                    subject_name=subj.name if subj else None,
-                    subject_is_common=subj.is_common if subj else None,
-                    teacher_profile_id=tp_id,
-                )
+            subj = subjects.get(payment.subject_id)
+            tp_id = profile_by_assignment.get(payment.assignment_id)
+            # Plain dict in TeacherPaymentWithDetails shape
+            payments_with_details.append(_payment_with_details_to_dict(
+                payment,
+                stage_name=stage.name,
+                section_name=sec.name if sec else None,
+                subject_name=subj.name if subj else None,
+                subject_is_common=subj.is_common if subj else None,
+                teacher_profile_id=tp_id,
             ))
 
-        return CalculatePaymentsResponse(
-            success=True,
-            message=f"Successfully calculated payments for {len(payments_created)} teachers",
-            payments_calculated=len(payments_created),
-            total_payment=total_payment_sum,
-            payments=payments_with_details,
-            audit_id=audit_record.id,
-            audit_status=audit_status,
-            audit_warnings=audit_warnings,
+        db.commit()
+        logger.info(
+            f"Audit saved: id={audit_id}, status={audit_status}, "
+            f"warnings={len(audit_warnings)}, verification={verification_status}"
         )
 
+        # The payment dicts are built from stored rows in CalculatePaymentsResponse
+        # shape — render them directly instead of validating the model twice
+        # (once here, once more against response_model)
+        return JSONResponse(content=jsonable_encoder({
+            "success": True,
+            "message": f"Successfully calculated payments for {len(payments_created)} teachers",
+            "payments_calculated": len(payments_created),
+            "total_payment": total_payment_sum,
+            "payments": payments_with_details,
+            "audit_id": audit_id,
+            "audit_status": audit_status,
+            "audit_warnings": audit_warnings,
+        }))
+
     except HTTPException:
         raise
     except Exception as e:
@@ -3975,17 +4359,26 @@ def reset_period_stage(
 
 @app.get("/teacher-payments/{period_id}", response_model=List[TeacherPaymentWithDetails])
 def get_teacher_payments(period_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
-    payments = db.query(TeacherPayment).filter(TeacherPayment.period_id == period_id).all()
-    payments_with_details = []
-    for payment in payments:
-        stage = db.query(Stage).filter(Stage.id == payment.stage_id).first()
-        section = db.query(Section).filter(Section.id == payment.section_id).first()
-        subject = db.query(Subject).filter(Subject.id == payment.subject_id).first()
-        assignment = db.query(TeacherAssignment).filter(TeacherAssignment.id == payment.assignment_id).first()
-        tp_id = assignment.teacher_profile_id if assignment else None
-        payment_dict = {**payment.__dict__, "teacher_profile_id": tp_id, "stage_name": stage.name if stage else None,
-                        "section_name": section.name if section else None,
-                        "subject_name": subject.name if subject else None,
-                        "subject_is_common": subject.is_common if subject else None}
-        payments_with_details.append(TeacherPaymentWithDetails(**payment_dict))
-    return payments_with_details
+    # One SELECT ... IN per related table instead of four SELECTs per payment
+    payments = db.query(TeacherPayment).options(
+        *_STRICT_LOADING,
+        selectinload(TeacherPayment.stage).load_only(Stage.name),
+        selectinload(TeacherPayment.section).load_only(Section.name),
+        selectinload(TeacherPayment.subject).load_only(Subject.name, Subject.is_common),
+        selectinload(TeacherPayment.assignment).load_only(TeacherAssignment.teacher_profile_id),
+    ).filter(TeacherPayment.period_id == period_id).all()
+
+    def rows():
+        for payment in payments:
+            stage, section, subject = payment.stage, payment.section, payment.subject
+            yield _payment_with_details_to_dict(
+                payment,
+                stage_name=stage.name if stage else None,
+                section_name=section.name if section else None,
+                subject_name=subject.name if subject else None,
+                subject_is_common=subject.is_common if subject else None,
+                teacher_profile_id=payment.assignment.teacher_profile_id if payment.assignment else None,
+            )
+
+    # Rows are built and encoded as they stream rather than held as one list and one body
+    return StreamingResponse(_stream_json_array(rows()), media_type="application/json")
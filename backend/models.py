@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, Text, Boolean, DateTime, JSON, UniqueConstraint as models_UniqueConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Date, Text, Boolean, DateTime, JSON, Index, UniqueConstraint as models_UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 from database import Base
 from financial_models import (
@@ -8,6 +9,9 @@ from financial_models import (
     TeacherPayment, Base as FinancialBase
 )
 
+# JSONB on Postgres, plain JSON elsewhere (SQLite fallback)
+ChartJSON = JSON().with_variant(JSONB(), "postgresql")
+
 class LibraryConfig(Base):
     __tablename__ = "library_configs"
 
@@ -18,8 +22,8 @@ class LibraryConfig(Base):
     is_active = Column(Boolean, default=True)  # Whether to fetch stats for this library
     
     # Timestamps
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
 class Teacher(Base):
     __tablename__ = "teachers"
@@ -40,8 +44,8 @@ class User(Base):
     allowed_pages = Column(JSON, nullable=False, default=list)
     is_active = Column(Boolean, default=True)
     token_version = Column(Integer, default=1, nullable=False, server_default='1')
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
 class MonthlyStats(Base):
     __tablename__ = "monthly_stats"
@@ -57,12 +61,19 @@ class MonthlyStats(Base):
     total_watch_time_seconds = Column(Integer, default=0)
     
     # Timestamps
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     # Relationship
     teacher = relationship("Teacher", back_populates="monthly_stats")
 
+    # One row per teacher per month; sync-stats upserts on it
+    __table_args__ = (
+        models_UniqueConstraint('teacher_id', 'month', 'year', name='uq_monthly_stats_teacher_month_year'),
+        # Per-teacher history read ordered by (year DESC, month DESC)
+        Index('ix_monthly_stats_teacher_year_month', 'teacher_id', 'year', 'month'),
+    )
+
 class LibraryHistoricalStats(Base):
     __tablename__ = "library_historical_stats"
 
@@ -77,21 +88,29 @@ class LibraryHistoricalStats(Base):
     total_watch_time_seconds = Column(Integer, default=0)
     bandwidth_gb = Column(Float, default=0.0)
     
-    # Chart data stored as JSON
-    views_chart = Column(JSON, nullable=True)  # Daily views data
-    watch_time_chart = Column(JSON, nullable=True)  # Daily watch time data
-    bandwidth_chart = Column(JSON, nullable=True)  # Daily bandwidth data
+    # Chart data stored as JSON (binary JSONB on Postgres); deferred so ORM
+    # queries over many rows don't drag the daily arrays along
+    views_chart = deferred(Column(ChartJSON, nullable=True))  # Daily views data
+    watch_time_chart = deferred(Column(ChartJSON, nullable=True))  # Daily watch time data
+    bandwidth_chart = deferred(Column(ChartJSON, nullable=True))  # Daily bandwidth data
     
     # Additional metadata
-    fetch_date = Column(DateTime, default=func.now())  # When this data was fetched
+    fetch_date = Column(DateTime, server_default=func.now())  # When this data was fetched
     is_synced = Column(Boolean, default=False)  # Whether synced to Libraries page
     sync_date = Column(DateTime, nullable=True)  # When synced
     
     # Timestamps
-    created_at = Column(DateTime, default=func.now())
-    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    created_at = Column(DateTime, server_default=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
-    # Unique constraint to prevent duplicate entries for same library/month/year
+    # Unique constraint to prevent duplicate entries for same library/month/year.
+    # Not partitioned by year: at one row per library per month the table stays
+    # small, every per-period read is an index seek on the constraints below,
+    # and a partitioned table would need `year` in the primary key.
     __table_args__ = (
         models_UniqueConstraint('library_id', 'month', 'year', name='uq_library_month_year'),
+        # Per-library history read ordered by (year DESC, month DESC)
+        Index('ix_lhs_lib_year_month', 'library_id', 'year', 'month'),
+        # Sync / batch-fetch filter by period and sync state
+        Index('ix_lhs_month_year_synced', 'month', 'year', 'is_synced'),
     )
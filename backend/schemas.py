@@ -1,12 +1,6 @@
-from pydantic import BaseModel, EmailStr, validator, Field
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List, Dict, Any
-try:
-    from typing import Literal
-except ImportError:
-    from typing_extensions import Literal
-from enum import Enum
 from datetime import datetime
-from financial_schemas import *
 
 # Library Config schemas
 class LibraryConfigBase(BaseModel):
@@ -131,13 +125,16 @@ class LibraryHistoricalStatsBase(BaseModel):
     total_views: Optional[int] = 0
     total_watch_time_seconds: Optional[int] = 0
     bandwidth_gb: Optional[float] = 0.0
+
+class LibraryHistoricalStatsCharts(BaseModel):
     views_chart: Optional[Dict[str, Any]] = None
     watch_time_chart: Optional[Dict[str, Any]] = None
     bandwidth_chart: Optional[Dict[str, Any]] = None
 
-class LibraryHistoricalStatsCreate(LibraryHistoricalStatsBase):
+class LibraryHistoricalStatsCreate(LibraryHistoricalStatsCharts, LibraryHistoricalStatsBase):
     pass
 
+# Scalar stats only — the daily chart arrays are deferred on the model
 class LibraryHistoricalStats(LibraryHistoricalStatsBase):
     id: int
     fetch_date: datetime
@@ -149,6 +146,9 @@ class LibraryHistoricalStats(LibraryHistoricalStatsBase):
     class Config:
         orm_mode = True
 
+class LibraryHistoricalStatsWithCharts(LibraryHistoricalStatsCharts, LibraryHistoricalStats):
+    pass
+
 # Batch fetch request/response schemas
 class BatchFetchRequest(BaseModel):
     library_ids: List[int]
@@ -162,7 +162,7 @@ class LibraryFetchStatus(BaseModel):
     success: bool  # For frontend compatibility
     message: str
     error: Optional[str] = None  # For frontend compatibility
-    data: Optional[LibraryHistoricalStats] = None
+    data: Optional[LibraryHistoricalStatsWithCharts] = None
 
 class BatchFetchResponse(BaseModel):
     success: bool
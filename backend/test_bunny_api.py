@@ -1,6 +1,7 @@
 import asyncio
 import httpx
 import os
+import traceback
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -15,7 +16,7 @@ async def test_bunny_api():
         return
     
     try:
-        async with httpx.AsyncClient(verify=False) as client:
+        async with httpx.AsyncClient() as client:
             response = await client.get(
                 'https://api.bunny.net/videolibrary',
                 headers={'AccessKey': api_key},
@@ -23,19 +24,18 @@ async def test_bunny_api():
             )
             print(f'Status Code: {response.status_code}')
             print(f'Response: {response.text[:500]}')
-            
-            if response.status_code == 200:
-                libraries = response.json()
-                print(f'Found {len(libraries)} libraries')
-                for lib in libraries[:3]:  # Show first 3 libraries
-                    print(f"- Library ID: {lib.get('Id')}, Name: {lib.get('Name')}")
-            else:
-                print(f'Error: {response.status_code} - {response.text}')
-                
+            response.raise_for_status()
+
+            libraries = response.json()
+            print(f'Found {len(libraries)} libraries')
+            for lib in libraries[:3]:  # Show first 3 libraries
+                print(f"- Library ID: {lib.get('Id')}, Name: {lib.get('Name')}")
+
+    except httpx.HTTPStatusError as e:
+        print(f'Error: {e.response.status_code} - {e.response.text}')
     except Exception as e:
         print(f'Exception: {str(e)}')
-        import traceback
         traceback.print_exc()
 
 if __name__ == "__main__":
-    asyncio.run(test_bunny_api())
\ No newline at end of file
+    asyncio.run(test_bunny_api())